@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import argparse
+import re
+import time
+
+import numpy as np
+import porterstemmer
+from nltk import WordNetLemmatizer
+
+from air18.index.score import similarity_functions
+from air18.index.tokens import Tokenizer, TOKEN_SPLIT_REGEX
+
+from air18.search.ranking import top_k
+from air18.search.searcher import Searcher
+from air18.util.parsing import parse_json, parse_xml
+from air18.util.paths import DEFAULT_TOPIC_FILE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of repetitions per measurement, the fastest one is reported")
+
+    subparsers = parser.add_subparsers(dest="benchmark", title="benchmark")
+    subparsers.required = True
+
+    topk_parser = subparsers.add_parser("topk", help="per-topic latency of full sorting vs. top-k selection")
+    topk_parser.add_argument("--topics-file", "-t", type=argparse.FileType(),
+                             help="The topic file in TREC's format containing queries",
+                             default=DEFAULT_TOPIC_FILE)
+    topk_parser.add_argument("--show", type=int, default=1000, help="Number of documents to select per topic")
+    topk_parser.add_argument("--similarity", choices=sorted(similarity_functions), default="bm25",
+                             help="Similarity function, with its default parameters")
+    topk_parser.set_defaults(benchmark_function=topk)
+
+    tokenizer_parser = subparsers.add_parser("tokenizer", help="tokens per second of the tokenization pipeline")
+    tokenizer_parser.add_argument("files", nargs="+", help="Original TREC or JSON files to tokenize")
+    tokenizer_parser.add_argument("--case-folding", action="store_true", help="Apply case folding")
+    tokenizer_parser.add_argument("--stop-words", action="store_true", help="Remove stop words")
+    group = tokenizer_parser.add_mutually_exclusive_group()
+    group.add_argument("--stemming", action="store_true", help="Apply Porter Stemmer")
+    group.add_argument("--lemmatization", action="store_true", help="Apply lemmatization from NLTK")
+    tokenizer_parser.set_defaults(benchmark_function=tokenizer)
+
+    return parser.parse_args()
+
+
+def measure(fn, repeat):
+    """
+    :return: the fastest of repeat runs of fn in milliseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def full_sort(scores, matched):
+    # ranking as done before top-k selection: sort all matched documents
+    candidates = np.flatnonzero(matched)
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def print_summary(name, latencies):
+    print("{:30} mean {:8.3f} ms   median {:8.3f} ms   p95 {:8.3f} ms".format(
+        name, np.mean(latencies), np.median(latencies), np.percentile(latencies, 95)))
+
+
+def topk(params):
+    # without postings cache, so that repeated scoring reads the postings every time
+    searcher = Searcher(postings_cache_size=0)
+    topics = searcher.parse_topics(params.topics_file)
+    scoring_function = similarity_functions[params.similarity]
+
+    print("{:>6} {:>10} {:>12} {:>12} {:>12}".format("topic", "matched", "score [ms]", "sort [ms]", "top-k [ms]"))
+    sort_latencies, topk_latencies = [], []
+    for topic_num, terms in topics.items():
+        scores, matched = searcher.score(terms, scoring_function, b=0.25, k1=1.5)
+        score_ms = measure(lambda: searcher.score(terms, scoring_function, b=0.25, k1=1.5), params.repeat)
+        sort_ms = measure(lambda: full_sort(scores, matched), params.repeat)
+        topk_ms = measure(lambda: top_k(scores, matched, params.show), params.repeat)
+        print("{:>6} {:>10} {:>12.3f} {:>12.3f} {:>12.3f}".format(topic_num, np.count_nonzero(matched), score_ms,
+                                                                  sort_ms, topk_ms))
+        sort_latencies.append(score_ms + sort_ms)
+        topk_latencies.append(score_ms + topk_ms)
+
+    print()
+    print_summary("per-topic latency, full sort", sort_latencies)
+    print_summary("per-topic latency, top-k", topk_latencies)
+    searcher.close()
+
+
+def uncached_tokenize(text, params):
+    # tokenization as done before the tokenizer pipeline: every step set up anew per text
+    tokens = re.split(TOKEN_SPLIT_REGEX.pattern, text)
+    tokens = filter(None, tokens)
+    if params.case_folding:
+        tokens = map(str.lower, tokens)
+    if params.stop_words:
+        from air18.index.stopwords import stop_words_en
+        tokens = filter(lambda token: token not in stop_words_en, tokens)
+    if params.stemming:
+        tokens = map(porterstemmer.Stemmer(), tokens)
+    if params.lemmatization:
+        tokens = map(WordNetLemmatizer().lemmatize, tokens)
+    return list(tokens)
+
+
+def tokenizer(params):
+    texts = []
+    for file in params.files:
+        with open(file, encoding="iso-8859-1") as f:
+            texts.extend(text for _, text in (parse_json(f) if file.endswith(".json") else parse_xml(f)))
+
+    def tokenize_all(tokenize):
+        return sum(len(tokenize(text)) for text in texts)
+
+    num_tokens = tokenize_all(Tokenizer(params.case_folding, params.stop_words, params.stemming,
+                                        params.lemmatization))
+    print("{} documents, {} tokens".format(len(texts), num_tokens))
+
+    for name, make_tokenize in (("uncached", lambda: lambda text: uncached_tokenize(text, params)),
+                                ("pipeline", lambda: Tokenizer(params.case_folding, params.stop_words,
+                                                               params.stemming, params.lemmatization))):
+        # a fresh pipeline per repetition, so that the normalization cache starts cold every time
+        milliseconds = measure(lambda: tokenize_all(make_tokenize()), params.repeat)
+        print("{:10} {:12.0f} tokens/s".format(name, num_tokens / milliseconds * 1000))
+
+
+def main():
+    params = parse_args()
+    params.benchmark_function(params)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import argparse
+import itertools
+import os
+import sys
+
+from air18.eval.measures import MEASURES, evaluate_run
+from air18.eval.qrels import Qrels
+from air18.eval.runs import load_trec_run, search_runs
+from air18.eval.significance import paired_t_test, randomization_test
+from air18.index import score
+from air18.util.paths import DEFAULT_TOPIC_FILE, DEFAULT_QRELS_FILE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--qrels", type=argparse.FileType(), default=DEFAULT_QRELS_FILE,
+                        help="Relevance judgments in TREC format")
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--runs", type=score.run_spec, nargs="+",
+                       help="Search the index in-process with these scoring configurations, like tf-idf, "
+                            "bm25:k1=1.2,b=0.75 or bm25va")
+    group.add_argument("--trec-files", type=argparse.FileType(), nargs="+",
+                       help="Evaluate existing runs in TREC format instead of searching")
+
+    parser.add_argument("--topics-file", "-t", type=argparse.FileType(), default=DEFAULT_TOPIC_FILE,
+                        help="The topic file in TREC's format containing queries, used with --runs")
+    parser.add_argument("--show", type=int, default=1000,
+                        help="Maximum number of documents to retrieve per topic, used with --runs")
+    parser.add_argument("--measure", choices=MEASURES, default="map",
+                        help="Measure compared by the significance tests")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Significance level")
+    parser.add_argument("--permutations", type=int, default=100000,
+                        help="Number of permutations of the randomization test")
+    parser.add_argument("--per-topic", action="store_true", help="Also print the measures of every topic")
+
+    return parser.parse_args()
+
+
+def load_runs(params):
+    """
+    :return: Tuple (run names, list of dictionaries topic -> list of tuples (docno, score))
+    """
+    if params.trec_files is not None:
+        names = [os.path.splitext(os.path.basename(trec_file.name))[0] for trec_file in params.trec_files]
+        return names, [load_trec_run(trec_file) for trec_file in params.trec_files]
+
+    # imported here so that evaluating TREC files does not need an index
+    from air18.search.searcher import Searcher
+    try:
+        searcher = Searcher()
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    topics = searcher.parse_topics(params.topics_file)
+    results = search_runs(searcher, topics, params.runs, params.show)
+    searcher.close()
+    return [run.name for run in params.runs], results
+
+
+def print_evaluation(qrels, names, evaluations, per_topic):
+    name_width = max(len(name) for name in names + ["run"]) + 2
+    if per_topic:
+        for name, evaluation in zip(names, evaluations):
+            print("{:{}}{:>8}".format(name, name_width, "topic") + "".join("{:>10}".format(m) for m in MEASURES))
+            for i, topic in enumerate(qrels.topics):
+                print("{:{}}{:>8}".format("", name_width, topic) +
+                      "".join("{:>10.4f}".format(evaluation[m][i]) for m in MEASURES))
+            print()
+
+    print("{:{}}".format("run", name_width) + "".join("{:>10}".format(measure) for measure in MEASURES))
+    for name, evaluation in zip(names, evaluations):
+        print("{:{}}".format(name, name_width) +
+              "".join("{:>10.4f}".format(evaluation[measure].mean()) for measure in MEASURES))
+
+
+def print_significance(names, evaluations, measure, threshold, permutations):
+    print("Significance of differences in {} (threshold {})".format(measure, threshold))
+    for (name_a, a), (name_b, b) in itertools.combinations(zip(names, evaluations), 2):
+        t_p = paired_t_test(a[measure], b[measure])
+        randomization_p = randomization_test(a[measure], b[measure], permutations=permutations)
+        verdict = "significant" if max(t_p, randomization_p) <= threshold else "not significant"
+        print("{} vs {}: paired t-test p = {:.4g}, randomization test p = {:.4g} --> {}".format(
+            name_a, name_b, t_p, randomization_p, verdict))
+
+
+def main():
+    params = parse_args()
+    qrels = Qrels.load(params.qrels)
+    names, runs = load_runs(params)
+    evaluations = [evaluate_run(qrels, run) for run in runs]
+
+    print_evaluation(qrels, names, evaluations, params.per_topic)
+    if len(runs) > 1:
+        print()
+        print_significance(names, evaluations, params.measure, params.threshold, params.permutations)
+
+
+if __name__ == '__main__':
+    main()
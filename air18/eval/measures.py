@@ -0,0 +1,60 @@
+import numpy as np
+
+# evaluation depth of precision
+PRECISION_DEPTH = 10
+
+MEASURES = ["map", "P_10", "ndcg", "recall"]
+
+
+def average_precision(relevance, num_relevant):
+    """
+    :param relevance: boolean array, True for every relevant document in the ranking
+    :param num_relevant: number of relevant documents of the topic, retrieved or not
+    """
+    if num_relevant == 0:
+        return 0.0
+    precisions = np.cumsum(relevance) / np.arange(1, len(relevance) + 1)
+    return float(precisions[relevance].sum() / num_relevant)
+
+
+def dcg(gains):
+    return float((gains / np.log2(np.arange(2, len(gains) + 2))).sum())
+
+
+def trec_order(results):
+    """
+    Order results like trec_eval does: by descending score, ties by descending docno.
+
+    :param results: list of tuples (docno, score)
+    :return: list of docnos
+    """
+    return [docno for docno, _ in sorted(results, key=lambda result: (result[1], result[0]), reverse=True)]
+
+
+def evaluate_topic(qrels, topic, results):
+    """
+    :return: dictionary measure -> value of the results of one topic
+    """
+    docnos = trec_order(results)
+    gains = qrels.gains(topic, docnos)
+    relevance = gains > 0
+    num_relevant = qrels.num_relevant[topic]
+    ideal_dcg = dcg(qrels.ideal_gains[topic])
+
+    return {
+        "map": average_precision(relevance, num_relevant),
+        "P_10": float(relevance[:PRECISION_DEPTH].sum() / PRECISION_DEPTH),
+        "ndcg": dcg(gains) / ideal_dcg if ideal_dcg > 0 else 0.0,
+        "recall": float(relevance.sum() / num_relevant) if num_relevant > 0 else 0.0,
+    }
+
+
+def evaluate_run(qrels, run):
+    """
+    Evaluate a run over all judged topics. Like trec_eval -c, topics without results count as 0.
+
+    :param run: dictionary topic -> list of tuples (docno, score)
+    :return: dictionary measure -> array of per-topic values, ordered like qrels.topics
+    """
+    per_topic = [evaluate_topic(qrels, topic, run.get(topic, [])) for topic in qrels.topics]
+    return {measure: np.array([values[measure] for values in per_topic]) for measure in MEASURES}
@@ -0,0 +1,48 @@
+import collections
+
+import numpy as np
+
+
+def load_qrels(qrels_file):
+    """
+    Load relevance judgments in TREC format, one "<topic> <iteration> <docno> <relevance>" line per judgment.
+
+    :return: dictionary topic -> dictionary docno -> relevance
+    """
+    qrels = collections.defaultdict(dict)
+    for line in qrels_file:
+        fields = line.split()
+        if len(fields) == 4:
+            topic, _, docno, relevance = fields
+            qrels[topic][docno] = int(relevance)
+    return dict(qrels)
+
+
+def relevant_docnos(judgments):
+    return {docno for docno, relevance in judgments.items() if relevance > 0}
+
+
+class Qrels:
+    """
+    Relevance judgments with everything the measures need per topic precomputed once.
+    """
+    def __init__(self, qrels):
+        self.judgments = qrels
+        self.topics = sorted(qrels)
+        self.num_relevant = {topic: len(relevant_docnos(judgments)) for topic, judgments in qrels.items()}
+
+        # gains of the ideal ranking for nDCG
+        self.ideal_gains = {topic: np.array(sorted((relevance for relevance in judgments.values() if relevance > 0),
+                                                   reverse=True), dtype=np.float64)
+                            for topic, judgments in qrels.items()}
+
+    @staticmethod
+    def load(qrels_file):
+        return Qrels(load_qrels(qrels_file))
+
+    def gains(self, topic, docnos):
+        """
+        :return: array of the relevance of every docno of a ranking, unjudged documents are not relevant
+        """
+        judgments = self.judgments[topic]
+        return np.array([max(judgments.get(docno, 0), 0) for docno in docnos], dtype=np.float64)
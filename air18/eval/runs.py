@@ -0,0 +1,30 @@
+import collections
+
+
+def load_trec_run(trec_file):
+    """
+    Load a run in TREC format, one "<topic> Q0 <docno> <rank> <score> <run name>" line per result.
+
+    :return: dictionary topic -> list of tuples (docno, score)
+    """
+    run = collections.defaultdict(list)
+    for line in trec_file:
+        fields = line.split()
+        if len(fields) == 6:
+            topic, _, docno, _, score, _ = fields
+            run[topic].append((docno, float(score)))
+    return dict(run)
+
+
+def search_runs(searcher, topics, runs, max_docs):
+    """
+    Search all topics for several scoring configurations at once.
+
+    :param runs: list of air18.index.score.Run
+    :return: list of dictionaries topic -> list of tuples (docno, score), one per run
+    """
+    results = [{} for _ in runs]
+    for topic_num, terms in topics.items():
+        for run_results, topic_results in zip(results, searcher.search_runs(terms, runs, max_docs)):
+            run_results[topic_num] = topic_results
+    return results
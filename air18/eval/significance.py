@@ -0,0 +1,30 @@
+import numpy as np
+from scipy import stats
+
+RANDOMIZATION_SEED = 18
+
+
+def paired_t_test(a, b):
+    """
+    :return: two-sided p-value of a paired t-test of per-topic values a and b
+    """
+    return float(stats.ttest_rel(a, b).pvalue)
+
+
+def randomization_test(a, b, permutations=100000, batch_size=10000):
+    """
+    Two-sided paired randomization test: the sign of every per-topic difference is flipped at random, the p-value is
+    the share of permutations whose mean difference is at least as extreme as the observed one. Permutations are
+    evaluated as matrix operations in batches.
+    """
+    differences = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    observed = abs(differences.mean())
+    random = np.random.default_rng(RANDOMIZATION_SEED)
+
+    at_least_as_extreme = 0
+    for start in range(0, permutations, batch_size):
+        size = min(batch_size, permutations - start)
+        signs = random.choice((-1.0, 1.0), size=(size, len(differences)))
+        at_least_as_extreme += np.count_nonzero(np.abs(signs @ differences) / len(differences) >= observed - 1e-12)
+
+    return (at_least_as_extreme + 1) / (permutations + 1)
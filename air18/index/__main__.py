@@ -2,20 +2,28 @@
 
 import argparse
 
-import collections
 import glob
-import marshal
 import pickle
 import shutil
-from functools import reduce
 from itertools import chain
 
-from air18.index.common import create_token_stream, create_index
-from air18.index.spimi import save_spimi_blocks, merge_spimi_blocks
+from air18.index.common import create_token_stream, create_index, create_partial_index_stream, \
+    merge_partial_indexes, shift_index
+from air18.index.documents import DocumentStore
+from air18.index.impacts import load_impacts, save_impacts, write_impacts
+from air18.index.increments import MERGE_FACTOR, load_increments, save_increments, write_increment, should_merge, \
+    merge_increments, remove_increment
+from air18.index.postings import PostingsWriter
+from air18.index.spimi import save_spimi_blocks, merge_spimi_blocks, save_spimi_blocks_from_indexes
 from air18.util.paths import *
-from air18.index.map_reduce import segment_key, segment_keys, SegmentFile, air_map, \
-    air_reduce
-from air18.index.statistics import CollectionStatistics
+from air18.index.map_reduce import map_reduce_index
+from air18.index.shards import load_shards, shard_ranges, write_shards, method_index_paths
+from air18.index import score
+from air18.index.readers import IndexReader, open_method_index, open_index
+from air18.util.profiling import profile
+
+# options which change how documents are processed into tokens
+TOKENIZATION_OPTIONS = ["case_folding", "stop_words", "stemming", "lemmatization"]
 
 
 def parse_args():
@@ -33,64 +41,209 @@ def parse_args():
 
     parser.add_argument("--indexing-method",
                         choices=["simple", "spimi", "map_reduce"],
-                        required=True,
-                        help="Indexing method to use")
-
-    return parser.parse_args()
+                        help="Indexing method to use, required unless --append is given")
+    parser.add_argument("--append", action="store_true",
+                        help="Add the documents to the existing index as a new increment instead of re-indexing. "
+                             "Tokenization options must be the same as for the existing index")
+    parser.add_argument("--merge-factor", type=int, default=MERGE_FACTOR,
+                        help="Number of increments of the same size which are merged into one after appending")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes which parse and invert input files in parallel")
+    parser.add_argument("--memory-limit", type=int, default=1024,
+                        help="Approximate memory budget in MB of the in-memory postings of the spimi and map_reduce "
+                             "methods, beyond which a block or map output is written to disk")
+    parser.add_argument("--segments", type=int, default=8,
+                        help="Number of hash partitioned segments created by the map_reduce method")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Split the index into this many shards of contiguous document ranges, which the search "
+                             "scores in parallel")
+    parser.add_argument("--positions", action="store_true",
+                        help="Store the positions of terms in documents, which phrase queries need. Only supported by "
+                             "the spimi method without --workers, --shards and --append")
+    parser.add_argument("--impacts", type=score.run_spec, action="append", default=[],
+                        help="Scoring configuration like bm25:k1=1.2,b=0.75 or bm25va for which quantized scores of "
+                             "all postings are precomputed, see air18.search --impacts. Repeat the option for several "
+                             "configurations. Existing impact indexes are rebuilt after appending")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print a JSON report of the time spent per stage and throughput counters to stderr")
+
+    params = parser.parse_args()
+    if params.indexing_method is None and not params.append:
+        parser.error("the following arguments are required: --indexing-method")
+    if params.positions and (params.indexing_method != "spimi" or params.workers > 1 or params.shards > 1):
+        parser.error("--positions requires --indexing-method spimi and cannot be combined with --workers or --shards")
+    if params.append and params.shards > 1:
+        parser.error("--shards cannot be combined with --append, appending to a sharded index is not supported")
+    return params
+
+
+def invert(files, params):
+    """
+    :return: Tuple (index, documents, collection statistics) of the files, index in memory
+    """
+    with profile.time("invert"):
+        if params.workers > 1:
+            partial_indexes, documents, collection_statistics = create_partial_index_stream(files, params,
+                                                                                            params.workers)
+            return merge_partial_indexes(partial_indexes), documents, collection_statistics
+        else:
+            token_stream, documents, collection_statistics = create_token_stream(files, params)
+            return create_index(token_stream), documents, collection_statistics
 
 
 def simple(files, params):
-    token_stream, doc_stats, docid_docno_mapping, collection_statistics = create_token_stream(files, params)
-    index = create_index(token_stream)
+    index, documents, collection_statistics = invert(files, params)
+    with profile.time("write_postings"), PostingsWriter(SIMPLE_INDEX_PATH, SIMPLE_INDEX_INDEX_PATH,
+                                                        SIMPLE_INDEX_BOUNDS_PATH, *documents.arrays()) as writer:
+        for token in sorted(index):
+            docids, tfs = zip(*index[token])
+            writer.add(token, docids, tfs)
 
-    with open(SIMPLE_INDEX_PATH, mode="wb") as index_file:
-        marshal.dump(index, index_file)
-
-    return doc_stats, docid_docno_mapping, collection_statistics
+    return documents, collection_statistics
 
 
 def spimi(files, params):
-    token_stream, doc_stats, docid_docno_mapping, collection_statistics = create_token_stream(files, params)
-    num_blocks = save_spimi_blocks(token_stream)
+    with profile.time("save_spimi_blocks"):
+        if params.workers > 1:
+            partial_indexes, documents, collection_statistics = create_partial_index_stream(files, params,
+                                                                                            params.workers)
+            num_blocks = save_spimi_blocks_from_indexes(partial_indexes, documents, params.memory_limit * 1024 * 1024)
+        else:
+            token_stream, documents, collection_statistics = create_token_stream(files, params)
+            num_blocks = save_spimi_blocks(token_stream, documents, params.memory_limit * 1024 * 1024, params.positions)
+    profile.count("spimi_blocks", num_blocks)
     print("Saved {} intermediate SPIMI blocks. Now merging".format(num_blocks))
-    merge_spimi_blocks(num_blocks)
-    return doc_stats, docid_docno_mapping, collection_statistics
+    with profile.time("merge_spimi_blocks"):
+        merge_spimi_blocks(num_blocks, *documents.arrays())
+    return documents, collection_statistics
 
 
 def map_reduce(files, params):
-    segments = collections.defaultdict(list)
-    document_lengths_segment = dict()
-    collection_statistics_segment = list()
-    for token_stream, document_lengths, collection_statistics in (
-    air_map(file, params) for file in files):
-
-        # shuffle map results to segments
-        for doc_token in token_stream:
-            segments[segment_key(doc_token)].append(doc_token)
-
-
-        document_lengths_segment.update(document_lengths)
-        collection_statistics_segment.append(collection_statistics)
-
-    # document_lengths and collection_statistics merge could be included in same air_reduce function as separate case
-    # but was not for simplicity reason
-    segment_indexes = {seg_key: air_reduce(segment) for seg_key, segment in segments.items()}
-    collection_statistics = reduce(CollectionStatistics.merge, collection_statistics_segment)
-
-    # save indexes, simple strategy: using pickle
-    for seg_key in segment_keys:
-        with SegmentFile(seg_key, mode="wb") as segment_file:
-            pickle.dump(segment_indexes.get(seg_key), segment_file)
-
-    return document_lengths_segment, collection_statistics
-
-
-def main():
-    params = parse_args()
-
+    return map_reduce_index(files, params)
+
+
+def append(files, params):
+    """
+    Index files into a new increment of the existing index, continuing its docids, and merge increments according to
+    the logarithmic merge policy.
+    """
+    if not os.path.isfile(SETTINGS_FILEPATH):
+        raise FileNotFoundError("ERROR: Indexing settings file {} not found. Create an index before appending to "
+                                "it.".format(SETTINGS_FILEPATH))
+    if load_shards():
+        raise ValueError("ERROR: Appending to a sharded index is not supported, re-index all documents instead")
+    with open(SETTINGS_FILEPATH, "rb") as settings_file:
+        index_params = pickle.load(settings_file)
+    if getattr(index_params, "positions", False):
+        raise ValueError("ERROR: Appending to an index with positions is not supported, re-index all documents instead")
+    for option in TOKENIZATION_OPTIONS:
+        if getattr(params, option) != getattr(index_params, option):
+            raise ValueError("ERROR: Option {} differs from the existing index, documents would not be processed in "
+                             "the same way".format(option))
+
+    documents = DocumentStore.load(DOCUMENT_LENGTHS_PATH, DOCUMENT_AVGTFS_PATH, DOCNOS_PATH, DOCNO_OFFSETS_PATH)
+    with open(STATISTICS_FILEPATH, "rb") as stat_file:
+        statistics = pickle.load(stat_file)
+
+    index, new_documents, new_statistics = invert(files, params)
+    count_documents(new_documents, new_statistics)
+    if len(new_documents) == 0:
+        print("No documents to append")
+        return
+
+    offset = len(documents)
+    documents.extend(new_documents)
+    statistics = statistics.merge(new_statistics)
+
+    increments = load_increments()
+    doc_lengths, doc_avgtfs = documents.arrays()
+    with profile.time("write_increment"):
+        increments.append(write_increment(shift_index(index, offset), offset, len(documents), doc_lengths,
+                                          doc_avgtfs))
+    print("Appended documents {} to {}".format(offset, len(documents) - 1))
+
+    merged = []
+    while should_merge(increments, params.merge_factor):
+        to_merge = increments[-params.merge_factor:]
+        readers = [IndexReader(*increment.paths()) for increment in to_merge]
+        print("Merging {} increments of level {}".format(len(to_merge), to_merge[0].level))
+        with profile.time("merge_increments"):
+            increments[-params.merge_factor:] = [merge_increments(readers, to_merge, doc_lengths, doc_avgtfs)]
+        for reader in readers:
+            reader.close()
+        merged.extend(to_merge)
+
+    print("Saving statistics to index directory")
+    save_statistics(documents, statistics)
+
+    # the new increments only become live and merged ones can only be removed once the statistics are complete
+    save_increments(increments)
+    for increment in merged:
+        remove_increment(increment)
+
+    # impacts depend on the collection statistics, which have changed
+    runs = {impact_index.run.name: impact_index.run for impact_index in load_impacts().values()}
+    runs.update((run.name, run) for run in params.impacts)
+    if runs:
+        build_impacts(list(runs.values()), index_params, documents, statistics)
+
+
+def shard(documents, params):
+    """
+    Split the index written by the indexing method into params.shards shards and remove it.
+    """
+    doc_lengths, doc_avgtfs = documents.arrays()
+    ranges = shard_ranges(doc_lengths, params.shards)
+    print("Splitting index into {} shards".format(params.shards))
+
+    index = open_method_index(params)
+    write_shards(index, ranges, doc_lengths, doc_avgtfs)
+    index.close()
+    for path in method_index_paths(params):
+        os.remove(path)
+
+
+def build_impacts(runs, index_params, documents, statistics):
+    """
+    Precompute impact indexes of the scoring configurations runs over the whole index, replacing existing impact
+    indexes of the same runs.
+    """
+    doc_lengths, doc_avgtfs = documents.arrays()
+    statistics.finalize()
+    impact_indexes = load_impacts()
+    index = open_index(index_params)
+    for run in runs:
+        print("Computing impacts of run {}".format(run.name))
+        with profile.time("impacts"):
+            impact_indexes[run.name] = write_impacts(index, run, doc_lengths, doc_avgtfs, statistics)
+    index.close()
+    save_impacts(impact_indexes)
+
+
+def count_documents(documents, statistics):
+    profile.count("documents", len(documents))
+    profile.count("tokens", statistics.total_doc_length)
+
+
+def save_statistics(documents, statistics):
+    with profile.time("save_statistics"):
+        # save document statistics and docid -> docno mapping
+        documents.save(DOCUMENT_LENGTHS_PATH, DOCUMENT_AVGTFS_PATH, DOCNOS_PATH, DOCNO_OFFSETS_PATH)
+
+        # save collection statistics
+        with open(STATISTICS_FILEPATH, "wb") as stat_file:
+            pickle.dump(statistics, stat_file)
+
+
+def index_files(params):
     # get all files in specified directories recursively
-    files = chain.from_iterable(
-        (sorted(filter(os.path.isfile, glob.iglob('{}/**/*'.format(pattern), recursive=True))) for pattern in params.patterns))
+    files = list(chain.from_iterable(
+        (sorted(filter(os.path.isfile, glob.iglob('{}/**/*'.format(pattern), recursive=True))) for pattern in params.patterns)))
+    profile.count("input_bytes", sum(os.path.getsize(file) for file in files))
+
+    if params.append:
+        append(files, params)
+        return
 
     print("Clearing old index files")
     shutil.rmtree(INDEX_BASE, ignore_errors=True)
@@ -98,34 +251,43 @@ def main():
 
     print("Starting to index")
     if params.indexing_method == "simple":
-        doc_stats, docid_docno_mapping, statistics = simple(files, params)
+        documents, statistics = simple(files, params)
     elif params.indexing_method == "spimi":
-        doc_stats, docid_docno_mapping, statistics = spimi(files, params)
+        documents, statistics = spimi(files, params)
     elif params.indexing_method == "map_reduce":
-        doc_stats, statistics = map_reduce(files, params)
-        docid_docno_mapping = None
+        documents, statistics = map_reduce(files, params)
     else:
         raise ValueError("Indexing method {} is unknown".format(params.indexing_method))
+    count_documents(documents, statistics)
+
+    if params.shards > 1:
+        with profile.time("shard"):
+            shard(documents, params)
 
     # --------------- Save auxiliary index files --------------
     print("Saving statistics and settings to index directory")
-
-    # save docid -> docno mapping
-    with open(DOCID_DOCNO_MAPPING, "wb") as mapping_file:
-        marshal.dump(docid_docno_mapping, mapping_file)
-
-    # save document statistics
-    with open(DOCUMENT_STATISTICS_FILEPATH, "wb") as stat_file:
-        marshal.dump(doc_stats, stat_file)
-
-    # save collection statistics
-    with open(STATISTICS_FILEPATH, "wb") as stat_file:
-        pickle.dump(statistics, stat_file)
+    save_statistics(documents, statistics)
 
     # save params so that the search script knows how to process query tokens
     with open(SETTINGS_FILEPATH, "wb") as settings_file:
         pickle.dump(params, settings_file)
 
+    if params.impacts:
+        build_impacts(params.impacts, params, documents, statistics)
+
+
+def main():
+    params = parse_args()
+    if params.profile:
+        profile.enable()
+
+    with profile.time("total"):
+        index_files(params)
+
+    if params.profile:
+        profile.count("index_bytes", sum(entry.stat().st_size for entry in os.scandir(INDEX_BASE) if entry.is_file()))
+        profile.write()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,108 @@
+import struct
+from itertools import chain
+
+import numpy as np
+
+# header of a bounds file: number of terms and total number of skyline postings
+BOUNDS_HEADER = struct.Struct("<QQ")
+
+
+def score_bound_data(docids, tfs, doc_lengths, doc_avgtfs):
+    """
+    Summarize a postings list for computing upper bounds of its term's scores at query time, for any parameters of
+    the similarity functions. Scores grow with tf and shrink with dl and avgtf, so it suffices to keep the skyline of
+    postings which are not dominated by a posting with higher or equal tf and lower or equal dl, plus the smallest
+    avgtf of the list.
+
+    :param docids: array or list of docids, lists are summarized in plain Python
+    :return: Tuple (min avgtf, skyline tfs, skyline dls), skyline ordered by descending tf
+    """
+    if isinstance(docids, list):
+        return short_score_bound_data(docids, tfs, doc_lengths, doc_avgtfs)
+
+    dls = doc_lengths[docids]
+    order = np.lexsort((dls, -tfs))
+    tfs, dls = tfs[order], dls[order]
+
+    # a posting is on the skyline if it is shorter than all postings with a higher tf
+    shortest_before = np.minimum.accumulate(np.concatenate(([np.iinfo(np.int64).max], dls[:-1])))
+    on_skyline = dls < shortest_before
+    return float(doc_avgtfs[docids].min()), tuple(tfs[on_skyline].tolist()), tuple(dls[on_skyline].tolist())
+
+
+def short_score_bound_data(docids, tfs, doc_lengths, doc_avgtfs):
+    """
+    Like score_bound_data, for lists of ints.
+    """
+    return (float(doc_avgtfs[docids].min()),) + skyline(tfs, doc_lengths[docids].tolist())
+
+
+def merge_score_bound_data(bound_data):
+    """
+    Combine the score bound data of postings lists of disjoint documents into the data of their concatenation. A
+    posting which is dominated within its list is dominated in the concatenation, so the skyline of the concatenation
+    is the skyline of the skylines of the lists.
+    """
+    if len(bound_data) == 1:
+        return bound_data[0]
+
+    min_avgtf = min(list_min_avgtf for list_min_avgtf, _, _ in bound_data)
+    return (min_avgtf,) + skyline([tf for _, tfs, _ in bound_data for tf in tfs],
+                                  [dl for _, _, dls in bound_data for dl in dls])
+
+
+def skyline(tfs, dls):
+    """
+    :return: Tuple (skyline tfs, skyline dls) of postings given as lists of ints, ordered by descending tf
+    """
+    skyline_tfs, skyline_dls = [], []
+    shortest = None
+    for tf, dl in sorted(zip(tfs, dls), key=lambda posting: (-posting[0], posting[1])):
+        if shortest is None or dl < shortest:
+            skyline_tfs.append(tf)
+            skyline_dls.append(dl)
+            shortest = dl
+    return tuple(skyline_tfs), tuple(skyline_dls)
+
+
+def write_bounds(path, bound_data):
+    """
+    Write the score bound data of all terms of an index, ordered like the terms. After the header follow the offsets
+    of the skylines of all terms with an end marker, the min avgtfs, and the tfs and dls of all skylines.
+    """
+    lengths = [len(tfs) for _, tfs, _ in bound_data]
+    ends = np.zeros(len(bound_data) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=ends[1:])
+    with open(path, "wb") as bounds_file:
+        bounds_file.write(BOUNDS_HEADER.pack(len(bound_data), int(ends[-1])))
+        bounds_file.write(ends.tobytes())
+        bounds_file.write(np.array([min_avgtf for min_avgtf, _, _ in bound_data], dtype=np.float64).tobytes())
+        bounds_file.write(np.fromiter(chain.from_iterable(tfs for _, tfs, _ in bound_data), dtype=np.uint32,
+                                      count=int(ends[-1])).tobytes())
+        bounds_file.write(np.fromiter(chain.from_iterable(dls for _, _, dls in bound_data), dtype=np.uint32,
+                                      count=int(ends[-1])).tobytes())
+
+
+class BoundsReader:
+    """
+    Read access to a bounds file written by write_bounds. The file is memory-mapped, so looking up the bound data of
+    a term by its ordinal in the term dictionary only reads the data of that term.
+    """
+    def __init__(self, path):
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        num_terms, num_postings = BOUNDS_HEADER.unpack(buffer[:BOUNDS_HEADER.size].tobytes())
+        offset = BOUNDS_HEADER.size
+        self.ends = np.frombuffer(buffer, dtype=np.int64, count=num_terms + 1, offset=offset)
+        offset += self.ends.nbytes
+        self.min_avgtfs = np.frombuffer(buffer, dtype=np.float64, count=num_terms, offset=offset)
+        offset += self.min_avgtfs.nbytes
+        self.tfs = np.frombuffer(buffer, dtype=np.uint32, count=num_postings, offset=offset)
+        self.dls = np.frombuffer(buffer, dtype=np.uint32, count=num_postings, offset=offset + self.tfs.nbytes)
+
+    def __getitem__(self, ordinal):
+        """
+        :return: Tuple (min avgtf, skyline tfs, skyline dls) of the term, skyline as int64 arrays
+        """
+        start, end = self.ends[ordinal:ordinal + 2].tolist()
+        return (float(self.min_avgtfs[ordinal]), self.tfs[start:end].astype(np.int64),
+                self.dls[start:end].astype(np.int64))
@@ -1,30 +1,32 @@
 import collections
+import multiprocessing
 from functools import partial
 from itertools import chain
-from typing import Union, Dict, Tuple
+from typing import Union, Tuple
 
+from air18.index.documents import DocumentStore
 from air18.util.parsing import parse_json, parse_xml
+from air18.util.profiling import profile
 from air18.index.statistics import CollectionStatistics
-from air18.index.tokens import air_tokenize
+from air18.index.tokens import get_tokenizer
 
+# rough CPython memory footprint of in-memory postings, used to decide when postings are written to disk
+TERM_MEMORY = 200
+POSTING_MEMORY = 100
+POSITION_MEMORY = 36
 
-def parse_and_process_file(file, params, docid_docno_mapping: Union[Dict[int, str], None],
-                           doc_stats: Dict[int, Tuple],
-                           collection_statistics: CollectionStatistics):
+
+def parse_and_process_file(file, params, documents: DocumentStore, collection_statistics: CollectionStatistics):
     """
     Parse and tokenize file.
 
     :param file: path to the input file
     :param params: argparse params
-    :param docid_docno_mapping: a dictionary containing the mapping, or None if mapping should be disabled
-    :param doc_stats: a dictionary filled with statistics per document
+    :param documents: store to which the statistics and docno of every non-empty document are added
     :param collection_statistics:
     :return: nothing, yield Tuples (docid, token)
     """
-    if docid_docno_mapping is None:
-        map_docid = False
-    else:
-        map_docid = True
+    tokenizer = profile.timed("tokenize", get_tokenizer(params))
 
     print("Parsing file {}".format(file))
     with open(file, encoding="iso-8859-1") as f:
@@ -32,18 +34,15 @@ def parse_and_process_file(file, params, docid_docno_mapping: Union[Dict[int, st
             data = parse_json(f)
         else:
             data = parse_xml(f)
+        data = profile.timed_iter("parse", data)
 
         for docno, text in data:
-            if map_docid:
-                docid = collection_statistics.num_documents
-                docid_docno_mapping[docid] = docno
-            else:
-                docid = docno
+            # empty documents are not added, so the next document gets the same docid
+            docid = len(documents)
 
             dl = 0
             unique_terms = set()
-            for token in air_tokenize(text, params.case_folding, params.stop_words,
-                                      params.stemming, params.lemmatization):
+            for token in tokenizer(text):
                 dl += 1
                 unique_terms.add(token)
                 yield (docid, token)
@@ -51,7 +50,7 @@ def parse_and_process_file(file, params, docid_docno_mapping: Union[Dict[int, st
             if len(unique_terms) > 0:
                 # save document statistics
                 avgtf = dl / len(unique_terms)
-                doc_stats[docid] = (dl, avgtf)
+                documents.add(docno, dl, avgtf)
 
                 # update collection statistics
                 collection_statistics.total_doc_length += dl
@@ -60,15 +59,77 @@ def parse_and_process_file(file, params, docid_docno_mapping: Union[Dict[int, st
 
 
 def create_token_stream(files, params):
-    doc_stats = {}
-    docid_docno_mapping = {}
+    documents = DocumentStore()
     statistics = CollectionStatistics()
-    parse_fn = partial(parse_and_process_file, params=params,
-                       docid_docno_mapping=docid_docno_mapping,
-                       doc_stats=doc_stats,
-                       collection_statistics=statistics)
+    parse_fn = partial(parse_and_process_file, params=params, documents=documents, collection_statistics=statistics)
     token_stream = chain.from_iterable(parse_fn(file=file) for file in files)
-    return token_stream, doc_stats, docid_docno_mapping, statistics
+    return token_stream, documents, statistics
+
+
+def index_file(file, params):
+    """
+    Parse, tokenize and invert a single file. Docids are local to the file and start at 0, they are shifted to
+    global docids by the caller. This is the unit of work of the process pool in create_partial_index_stream.
+
+    :param file: path to the input file
+    :param params: argparse params
+    :return: Tuple (index, documents) of the file
+    """
+    documents = DocumentStore()
+    token_stream = parse_and_process_file(file, params, documents, CollectionStatistics())
+    index = create_index(token_stream)
+    return index, documents
+
+
+def add_file_statistics(file_documents, documents, statistics):
+    """
+    Add the documents of a file indexed with local docids to the collection wide store and statistics.
+
+    :return: the docid offset of the file
+    """
+    offset = len(documents)
+    documents.extend(file_documents)
+
+    # accumulate statistics document by document so that floating point sums equal the sequential ones
+    for dl, avgtf in zip(file_documents.lengths, file_documents.avgtfs):
+        statistics.total_doc_length += dl
+        statistics.sum_avgtf += avgtf
+        statistics.num_documents += 1
+
+    return offset
+
+
+def shift_index(index, offset):
+    if offset == 0:
+        return index
+    return {token: [(docid + offset, tf) for docid, tf in postings] for token, postings in index.items()}
+
+
+def create_partial_index_stream(files, params, workers):
+    """
+    Parallel counterpart of create_token_stream. Files are parsed and inverted by a pool of worker processes and the
+    partial indexes are yielded in input file order with docids shifted to the same global docids the sequential
+    token stream would assign. Like for create_token_stream, the returned statistics are only complete after the
+    stream has been consumed.
+    """
+    documents = DocumentStore()
+    statistics = CollectionStatistics()
+
+    def partial_indexes():
+        with multiprocessing.Pool(workers) as pool:
+            for index, file_documents in pool.imap(partial(index_file, params=params), files):
+                yield shift_index(index, add_file_statistics(file_documents, documents, statistics))
+
+    return partial_indexes(), documents, statistics
+
+
+def merge_partial_indexes(partial_indexes):
+    # partial indexes cover ascending, disjoint docid ranges, so postings lists can simply be concatenated
+    index = {}
+    for partial_index in partial_indexes:
+        for token, postings in partial_index.items():
+            index.setdefault(token, []).extend(postings)
+    return index
 
 
 def create_index(doc_tokens: Tuple[Union[str, int], str]):
@@ -0,0 +1,197 @@
+import mmap
+import struct
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy as np
+
+from air18.index.varints import encode_varints, decode_varints
+
+# number of terms per front-coded block
+BLOCK_TERMS = 16
+
+# number of decoded blocks kept per dictionary, a query term is usually looked up several times in a row
+BLOCK_CACHE_SIZE = 1024
+
+# header of a block: postings offset of its first term, number of terms and length of its varints in bytes
+BLOCK_HEADER = struct.Struct("<QII")
+
+# footer of a dictionary file: number of terms, number of blocks and offset of the block index
+FOOTER = struct.Struct("<QQQ")
+
+
+def common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class DictionaryWriter:
+    """
+    Writes the terms of an index in ascending order with the position and document frequency of their postings lists,
+    which are stored one after another in the postings file.
+
+    Terms are front-coded in blocks of BLOCK_TERMS terms: every term is stored as the length of the prefix it shares
+    with the previous term of its block and the remaining suffix. A block holds the varints (prefix length, suffix
+    length, postings length, df) of all its terms followed by the suffixes. The first term of every block is also
+    stored in full in the block index at the end of the file, which is binary searched on lookup.
+    """
+    def __init__(self, path, buffering=-1):
+        self.path = path
+        self.buffering = buffering
+        self.num_terms = 0
+        self.block = []
+        self.block_offsets = []
+        self.first_terms = []
+
+    def __enter__(self):
+        self.file = open(self.path, "wb", buffering=self.buffering)
+        return self
+
+    def add(self, term, offset, length, df):
+        self.block.append((term.encode("utf-8"), offset, length, df))
+        self.num_terms += 1
+        if len(self.block) == BLOCK_TERMS:
+            self.write_block()
+
+    def write_block(self):
+        values = []
+        suffixes = []
+        previous = b""
+        for term, _, length, df in self.block:
+            prefix_length = common_prefix_length(previous, term)
+            values.extend((prefix_length, len(term) - prefix_length, length, df))
+            suffixes.append(term[prefix_length:])
+            previous = term
+
+        first_term, first_offset, _, _ = self.block[0]
+        varints = encode_varints(values)
+        self.block_offsets.append(self.file.tell())
+        self.first_terms.append(first_term)
+        self.file.write(BLOCK_HEADER.pack(first_offset, len(self.block), len(varints)))
+        self.file.write(varints)
+        self.file.write(b"".join(suffixes))
+        self.block = []
+
+    def __exit__(self, *args):
+        if self.block:
+            self.write_block()
+
+        # block index: offsets of all blocks and of their first terms in the first term blob, each with an end marker
+        index_offset = self.file.tell()
+        first_term_offsets = np.zeros(len(self.first_terms) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in self.first_terms], out=first_term_offsets[1:])
+        self.file.write(np.array(self.block_offsets + [index_offset], dtype=np.int64).tobytes())
+        self.file.write(first_term_offsets.tobytes())
+        self.file.write(b"".join(self.first_terms))
+        self.file.write(FOOTER.pack(self.num_terms, len(self.first_terms), index_offset))
+        self.file.close()
+
+
+class TermDictionary:
+    """
+    Read access to a term dictionary written by DictionaryWriter. The file is memory-mapped, a lookup binary searches
+    the first terms of the blocks and decodes a single block.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as dictionary_file:
+            self.buffer = mmap.mmap(dictionary_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.num_terms, self.num_blocks, index_offset = FOOTER.unpack_from(self.buffer, len(self.buffer) - FOOTER.size)
+        index_length = self.num_blocks + 1
+        self.block_offsets = np.frombuffer(self.buffer, dtype=np.int64, count=index_length,
+                                           offset=index_offset).tolist()
+        self.first_term_offsets = np.frombuffer(self.buffer, dtype=np.int64, count=index_length,
+                                                offset=index_offset + 8 * index_length).tolist()
+        self.first_terms_offset = index_offset + 16 * index_length
+        self.block = lru_cache(maxsize=BLOCK_CACHE_SIZE)(self.decode_block)
+
+    def __len__(self):
+        return self.num_terms
+
+    def first_term(self, blockno):
+        start = self.first_terms_offset + self.first_term_offsets[blockno]
+        end = self.first_terms_offset + self.first_term_offsets[blockno + 1]
+        return self.buffer[start:end]
+
+    def find_block(self, term):
+        """
+        :param term: UTF-8 encoded term
+        :return: number of the last block whose first term is not greater than term, -1 if there is none
+        """
+        low, high = 0, self.num_blocks
+        while low < high:
+            middle = (low + high) // 2
+            if self.first_term(middle) <= term:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def decode_block(self, blockno):
+        """
+        :return: Tuple (terms, postings offsets, postings lengths, dfs) of lists, terms UTF-8 encoded
+        """
+        start = self.block_offsets[blockno]
+        first_offset, num_terms, varints_length = BLOCK_HEADER.unpack_from(self.buffer, start)
+        start += BLOCK_HEADER.size
+        values = decode_varints(self.buffer[start:start + varints_length]).tolist()
+        position = start + varints_length
+
+        terms = []
+        term = b""
+        for prefix_length, suffix_length in zip(values[0::4], values[1::4]):
+            term = term[:prefix_length] + self.buffer[position:position + suffix_length]
+            position += suffix_length
+            terms.append(term)
+
+        lengths = values[2::4]
+        offsets = np.cumsum([first_offset] + lengths[:-1]).tolist()
+        return terms, offsets, lengths, values[3::4]
+
+    def lookup(self, term):
+        """
+        :return: Tuple (ordinal, postings offset, postings length, df) of term, or None if it is not in the dictionary.
+                 The ordinal is the position of the term in ascending term order.
+        """
+        key = term.encode("utf-8")
+        blockno = self.find_block(key)
+        if blockno < 0:
+            return None
+
+        terms, offsets, lengths, dfs = self.block(blockno)
+        position = bisect_left(terms, key)
+        if position == len(terms) or terms[position] != key:
+            return None
+        return blockno * BLOCK_TERMS + position, offsets[position], lengths[position], dfs[position]
+
+    def __contains__(self, term):
+        return self.lookup(term) is not None
+
+    def terms(self):
+        """
+        :return: iterator over all terms in ascending order
+        """
+        for blockno in range(self.num_blocks):
+            for term in self.block(blockno)[0]:
+                yield term.decode("utf-8")
+
+    def prefix(self, prefix):
+        """
+        :return: iterator over Tuples (term, df) of all terms starting with prefix, in ascending order
+        """
+        key = prefix.encode("utf-8")
+        for blockno in range(max(self.find_block(key), 0), self.num_blocks):
+            terms, _, _, dfs = self.block(blockno)
+            for term, df in zip(terms, dfs):
+                if term.startswith(key):
+                    yield term.decode("utf-8"), df
+                elif term > key:
+                    return
+
+    def close(self):
+        self.block.cache_clear()
+        self.buffer.close()
@@ -0,0 +1,69 @@
+from array import array
+
+import numpy as np
+
+
+class DocumentStore:
+    """
+    Statistics and docnos of the indexed documents in dense arrays indexed by docid. Docids are assigned in the order
+    in which documents are added, starting at 0.
+    """
+    def __init__(self):
+        self.lengths = array("I")
+        self.avgtfs = array("d")
+        self.docnos = []
+
+    @classmethod
+    def load(cls, lengths_path, avgtfs_path, docnos_path, docno_offsets_path):
+        """
+        Load a store saved with save, so that more documents can be added to it.
+        """
+        documents = cls()
+        documents.lengths.frombytes(np.load(lengths_path).tobytes())
+        documents.avgtfs.frombytes(np.load(avgtfs_path).tobytes())
+        blob = np.load(docnos_path).tobytes()
+        offsets = np.load(docno_offsets_path).tolist()
+        documents.docnos = [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+        return documents
+
+    def __len__(self):
+        return len(self.docnos)
+
+    def add(self, docno, dl, avgtf):
+        """
+        :return: the docid of the added document
+        """
+        self.lengths.append(dl)
+        self.avgtfs.append(avgtf)
+        self.docnos.append(docno)
+        return len(self.docnos) - 1
+
+    def extend(self, documents):
+        """
+        Append all documents of another store, shifting their docids by the current number of documents.
+        """
+        self.lengths.extend(documents.lengths)
+        self.avgtfs.extend(documents.avgtfs)
+        self.docnos.extend(documents.docnos)
+
+    def arrays(self):
+        """
+        :return: Tuple (document lengths, average term frequencies) as NumPy arrays indexed by docid
+        """
+        # copies, so that the stores can still grow afterwards
+        return (np.frombuffer(self.lengths, dtype=np.uint32).astype(np.int64),
+                np.frombuffer(self.avgtfs, dtype=np.float64).copy())
+
+    def save(self, lengths_path, avgtfs_path, docnos_path, docno_offsets_path):
+        """
+        Save document lengths and average term frequencies as NumPy arrays, and all docnos as one UTF-8 blob with
+        the offsets of every docno in it, so that all of them can be memory-mapped by DocumentReader.
+        """
+        np.save(lengths_path, np.frombuffer(self.lengths, dtype=np.uint32))
+        np.save(avgtfs_path, np.frombuffer(self.avgtfs, dtype=np.float64))
+
+        encoded = [docno.encode("utf-8") for docno in self.docnos]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(docno) for docno in encoded], out=offsets[1:])
+        np.save(docnos_path, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        np.save(docno_offsets_path, offsets)
@@ -0,0 +1,124 @@
+import os
+import pickle
+import struct
+from collections import namedtuple
+from math import log
+
+import numpy as np
+
+from air18.index.dictionary import DictionaryWriter
+from air18.index.postings import FILE_BUFFER_SIZE
+from air18.index.score import similarity_functions
+from air18.index.varints import encode_varints, decode_varints, cumsum_segments
+from air18.util.paths import INDEX_BASE, IMPACTS_FILEPATH
+
+# impacts are quantized to integers in [0, MAX_IMPACT]
+IMPACT_BITS = 8
+MAX_IMPACT = (1 << IMPACT_BITS) - 1
+
+# header of an encoded impact list: the scale of its impacts
+IMPACT_HEADER = struct.Struct("<d")
+
+
+class ImpactIndex(namedtuple("ImpactIndex", ["run"])):
+    """
+    Precomputed scores of every posting for one scoring configuration (air18.index.score.Run), quantized to impacts.
+    Every postings list has its own scale, an impact i of the list stands for the score i * scale.
+    """
+    def paths(self):
+        """
+        :return: Tuple (postings path, dictionary path) of the impact index
+        """
+        name = os.path.join(INDEX_BASE, "impacts_{}".format(self.run.name))
+        return name + ".bin", name + "_dictionary.bin"
+
+
+def encode_impacts(docids, impacts, scale):
+    """
+    Encode a postings list sorted by descending impact. Postings of the same impact form a segment, in which docids
+    are ascending and gap encoded. The scale of the impacts is followed by the varints: the number of segments,
+    (impact, number of postings) of every segment and the docid gaps of all segments, the first gap of a segment is
+    relative to docid 0.
+    """
+    order = np.lexsort((docids, -impacts))
+    docids, impacts = docids[order], impacts[order]
+    starts = np.flatnonzero(np.diff(impacts, prepend=-1))
+    counts = np.diff(np.append(starts, len(docids)))
+
+    gaps = np.diff(docids, prepend=0)
+    gaps[starts] = docids[starts]
+    header = np.empty(1 + 2 * len(starts), dtype=np.int64)
+    header[0] = len(starts)
+    header[1::2] = impacts[starts]
+    header[2::2] = counts
+    return IMPACT_HEADER.pack(scale) + encode_varints(np.concatenate((header, gaps)))
+
+
+def decode_impacts(buffer):
+    """
+    :param buffer: uint8 array of an encoded impact list
+    :return: Tuple (scores, counts, docids) of arrays: the score of every segment in descending order, which is its
+             impact times the scale of the list, the number of postings of every segment, and the docids of all
+             segments one after another, ascending within each segment
+    """
+    scale, = IMPACT_HEADER.unpack_from(buffer)
+    values = decode_varints(buffer[IMPACT_HEADER.size:])
+    num_segments = int(values[0])
+    counts = values[2:2 + 2 * num_segments:2]
+    return values[1:1 + 2 * num_segments:2] * scale, counts, cumsum_segments(values[1 + 2 * num_segments:], counts)
+
+
+def term_scores(index, term, run, doc_lengths, doc_avgtfs, collection_statistics):
+    """
+    :return: Tuple (docids, scores) of all postings of term under the scoring configuration run
+    """
+    docids, tfs = index.postings(term)
+    idf_t = log(collection_statistics.num_documents / len(docids))
+    scores = similarity_functions[run.similarity](tf_td=tfs, idf_t=idf_t, dl=doc_lengths[docids],
+                                                  avgtf=doc_avgtfs[docids],
+                                                  collection_statistics=collection_statistics, **run.parameters)
+    return docids, scores
+
+
+def write_impacts(index, run, doc_lengths, doc_avgtfs, collection_statistics):
+    """
+    Score every posting of index with run and write the quantized scores as an impact index. The scores of every
+    postings list are quantized uniformly between 0 and the largest score of the list, so that lists of rare and
+    frequent terms keep the same relative precision. Negative scores are raised to 0.
+
+    :param index: reader of the whole index, see air18.index.readers
+    :param collection_statistics: finalized statistics of the whole collection
+    :return: the ImpactIndex
+    """
+    impact_index = ImpactIndex(run)
+
+    postings_path, dictionary_path = impact_index.paths()
+    with open(postings_path, "wb", buffering=FILE_BUFFER_SIZE) as postings_file, \
+            DictionaryWriter(dictionary_path, buffering=FILE_BUFFER_SIZE) as dictionary:
+        offset = 0
+        for term in index.terms():
+            docids, scores = term_scores(index, term, run, doc_lengths, doc_avgtfs, collection_statistics)
+            max_score = float(scores.max())
+            scale = max_score / MAX_IMPACT if max_score > 0 else 1.0
+            impacts = np.clip(np.rint(scores / scale), 0, MAX_IMPACT).astype(np.int64)
+            payload = encode_impacts(docids, impacts, scale)
+            dictionary.add(term, offset, len(payload), len(docids))
+            postings_file.write(payload)
+            offset += len(payload)
+
+    return impact_index
+
+
+def load_impacts():
+    """
+    :return: dictionary run name -> ImpactIndex of all impact indexes, empty if none has been built
+    """
+    if not os.path.isfile(IMPACTS_FILEPATH):
+        return {}
+    with open(IMPACTS_FILEPATH, "rb") as impacts_file:
+        return pickle.load(impacts_file)
+
+
+def save_impacts(impact_indexes):
+    with open(IMPACTS_FILEPATH, "wb") as impacts_file:
+        pickle.dump(impact_indexes, impacts_file)
@@ -0,0 +1,85 @@
+import os
+import pickle
+from collections import namedtuple
+
+import numpy as np
+
+from air18.index.postings import PostingsWriter
+from air18.util.paths import INDEX_BASE, INCREMENTS_FILEPATH
+
+# number of increments of the same level which are merged into one increment of the next level
+MERGE_FACTOR = 4
+
+
+class Increment(namedtuple("Increment", ["first_docid", "end_docid", "level"])):
+    """
+    An immutable postings file of the documents with docids in [first_docid, end_docid) appended to an existing index.
+    Level 0 increments are created by appending, increments of level n + 1 by merging increments of level n.
+    """
+    def paths(self):
+        """
+        :return: Tuple (postings path, dictionary path, bounds path) of the increment
+        """
+        name = os.path.join(INDEX_BASE, "increment_{}_{}".format(self.first_docid, self.end_docid))
+        return name + ".bin", name + "_dictionary.bin", name + "_bounds.bin"
+
+
+def load_increments():
+    """
+    :return: list of the live increments in ascending docid order, empty if nothing has been appended to the index
+    """
+    if not os.path.isfile(INCREMENTS_FILEPATH):
+        return []
+    with open(INCREMENTS_FILEPATH, "rb") as increments_file:
+        return pickle.load(increments_file)
+
+
+def save_increments(increments):
+    with open(INCREMENTS_FILEPATH, "wb") as increments_file:
+        pickle.dump(increments, increments_file)
+
+
+def write_increment(index, first_docid, end_docid, doc_lengths, doc_avgtfs):
+    """
+    Write an inverted index of appended documents, given as dictionary token -> list of (docid, tf), to a new level 0
+    increment.
+    """
+    increment = Increment(first_docid, end_docid, 0)
+    with PostingsWriter(*increment.paths(), doc_lengths, doc_avgtfs) as writer:
+        for token in sorted(index):
+            docids, tfs = zip(*index[token])
+            writer.add(token, docids, tfs)
+    return increment
+
+
+def should_merge(increments, merge_factor=MERGE_FACTOR):
+    """
+    Logarithmic merge policy: as soon as merge_factor increments have the same level, they are merged into one
+    increment of the next level. Levels therefore never grow from the oldest to the newest increment, and the
+    increments to merge are always the merge_factor newest ones, which cover adjacent docid ranges.
+    """
+    newest = increments[-merge_factor:]
+    return len(newest) == merge_factor and len({increment.level for increment in newest}) == 1
+
+
+def merge_increments(readers, increments, doc_lengths, doc_avgtfs):
+    """
+    Merge adjacent increments into one. Increments cover ascending, disjoint docid ranges, so the postings lists of a
+    term are concatenated in increment order.
+
+    :param readers: air18.index.readers.IndexReader of every increment to merge
+    :param increments: the increments to merge, in ascending docid order
+    :return: the merged increment
+    """
+    merged = Increment(increments[0].first_docid, increments[-1].end_docid, increments[0].level + 1)
+    with PostingsWriter(*merged.paths(), doc_lengths, doc_avgtfs) as writer:
+        for term in sorted(set().union(*(reader.terms() for reader in readers))):
+            postings = [reader.postings(term) for reader in readers if term in reader]
+            writer.add(term, np.concatenate([docids for docids, _ in postings]),
+                       np.concatenate([tfs for _, tfs in postings]))
+    return merged
+
+
+def remove_increment(increment):
+    for path in increment.paths():
+        os.remove(path)
@@ -1,43 +1,170 @@
+import collections
+import glob
+import heapq
+import marshal
+import multiprocessing
+import operator
 import os
+import zlib
+from functools import partial
+from itertools import groupby
 
-from air18.index.common import parse_and_process_file, create_index
+from air18.index.common import parse_and_process_file, add_file_statistics, TERM_MEMORY, POSTING_MEMORY
+from air18.index.documents import DocumentStore
+from air18.index.postings import MARSHAL_VERSION, PostingsWriter
 from air18.util.paths import INDEX_BASE
+from air18.util.profiling import profile
 from air18.index.statistics import CollectionStatistics
 
-segment_keys = ['a', 'f', 'k', 'p', 'u', 'z', 'o']
 
+def segment_key(token, num_segments):
+    # crc32 instead of the builtin hash, which is randomized per process
+    return zlib.crc32(token.encode("utf-8")) % num_segments
 
-def segment_key(doc_token):
-    t = doc_token[1][0].lower()
-    for segment_highest_key in segment_keys:
-        if t <= segment_highest_key:
-            return segment_highest_key
 
-    return segment_keys[-1]
+def segment_paths(key):
+    """
+    :return: Tuple (postings path, dictionary path, bounds path) of a segment
+    """
+    return (os.path.join(INDEX_BASE, "index_{}.bin".format(key)),
+            os.path.join(INDEX_BASE, "index_{}_dictionary.bin".format(key)),
+            os.path.join(INDEX_BASE, "index_{}_bounds.bin".format(key)))
 
 
-class SegmentFile:
-    def __init__(self, key, mode="rb"):
-        self.filename = os.path.join(INDEX_BASE, "index_{}.p".format(key))
-        self.key = key
+class RunFile:
+    """
+    A sorted run spilled by a mapper for one segment. Runs are named by segment, mapper and spill number, so that
+    ordering the runs of a segment by mapper and spill number yields them in ascending docid order.
+    """
+    def __init__(self, key, mapno, spillno, mode="rb"):
+        self.filename = os.path.join(INDEX_BASE, "map_run_{}_{:08d}_{:04d}.m".format(key, mapno, spillno))
         self.mode = mode
 
+    @staticmethod
+    def filenames(key):
+        # ordered by the numbers, not by the names, as spill numbers may have more digits than their zero padding
+        return sorted(glob.glob(os.path.join(INDEX_BASE, "map_run_{}_*.m".format(key))), key=RunFile.numbers)
+
+    @staticmethod
+    def numbers(filename):
+        """
+        :return: Tuple (mapper number, spill number) of a run file
+        """
+        mapno, spillno = os.path.splitext(os.path.basename(filename))[0].split("_")[-2:]
+        return int(mapno), int(spillno)
+
+    @staticmethod
+    def mapno(filename):
+        return RunFile.numbers(filename)[0]
+
     def __enter__(self):
-        self.segment_file = open(self.filename, self.mode)
-        return self.segment_file
+        self.run_file = open(self.filename, self.mode)
+        return self.run_file
 
     def __exit__(self, *args):
-        self.segment_file.close()
+        self.run_file.close()
+
+
+def spill(segments, mapno, spillno):
+    for seg_key, segment in segments.items():
+        with RunFile(seg_key, mapno, spillno, mode="wb") as run_file:
+            for token in sorted(segment):
+                marshal.dump((token, segment[token]), run_file, MARSHAL_VERSION)
+
+
+def air_map(mapno_file, params, memory_limit):
+    """
+    Parse and tokenize one file and spill its postings hash partitioned into params.segments segments and sorted by
+    token to run files.
+    The in-memory map output is spilled whenever it exceeds memory_limit bytes. Docids are local to the file.
+
+    :param mapno_file: Tuple (number of the mapper, path to the input file)
+    :param params: argparse params
+    :param memory_limit: approximate memory budget of this mapper in bytes
+    :return: the documents of the file, see air18.index.documents.DocumentStore
+    """
+    mapno, file = mapno_file
+    documents = DocumentStore()
+    token_stream = parse_and_process_file(file, params, documents, CollectionStatistics())
+
+    segments = collections.defaultdict(lambda: collections.defaultdict(list))
+    memory = 0
+    spillno = 0
+    for docid, doc_tokens in groupby(token_stream, key=operator.itemgetter(0)):
+        for token, tf in collections.Counter(token for _, token in doc_tokens).items():
+            postings = segments[segment_key(token, params.segments)][token]
+            if not postings:
+                memory += TERM_MEMORY + len(token)
+            postings.append((docid, tf))
+            memory += POSTING_MEMORY
+
+        # spill only at document boundaries, so that runs of one mapper cover disjoint docid ranges
+        if memory >= memory_limit:
+            spill(segments, mapno, spillno)
+            segments.clear()
+            memory = 0
+            spillno += 1
+
+    spill(segments, mapno, spillno)
+    return documents
+
+
+def read_run(filename, offset):
+    with open(filename, "rb") as run_file:
+        while True:
+            try:
+                token, postings = marshal.load(run_file)
+            except EOFError:
+                return
+            yield token, [(docid + offset, tf) for docid, tf in postings]
+
+
+def air_reduce(seg_key, offsets, doc_lengths, doc_avgtfs):
+    """
+    Merge all runs of a segment into the final segment postings file. Runs of one token are concatenated in run order,
+    which is ascending global docid order.
+
+    :param seg_key: the segment to reduce
+    :param offsets: docid offset per mapper number, translating local to global docids
+    :param doc_lengths: document lengths indexed by global docid
+    :param doc_avgtfs: average term frequencies indexed by global docid
+    """
+    filenames = RunFile.filenames(seg_key)
+    runs = [read_run(filename, offsets[RunFile.mapno(filename)]) for filename in filenames]
+
+    # runs are merged in token order, so the segment can be written out as a stream
+    with PostingsWriter(*segment_paths(seg_key), doc_lengths, doc_avgtfs) as writer:
+        for token, token_postings in groupby(heapq.merge(*runs, key=operator.itemgetter(0)),
+                                             key=operator.itemgetter(0)):
+            postings = []
+            for _, run_postings in token_postings:
+                postings.extend(run_postings)
+            docids, tfs = zip(*postings)
+            writer.add(token, docids, tfs)
+
+    for filename in filenames:
+        os.remove(filename)
+
 
+def map_reduce_index(files, params):
+    """
+    Index files with parallel mappers, a shuffle via sorted run files on disk and one parallel reducer per segment.
+    Docids are assigned in input file order, exactly as by the sequential indexing methods.
+    """
+    documents = DocumentStore()
+    statistics = CollectionStatistics()
+    offsets = []
+    memory_limit = params.memory_limit * 1024 * 1024 // params.workers
 
-def air_map(file, params):
-    doc_stats = {}
-    collection_statistics = CollectionStatistics()
-    token_stream = parse_and_process_file(file, params, docid_docno_mapping=None,
-                                          doc_stats=doc_stats,
-                                          collection_statistics=collection_statistics)
-    return token_stream, doc_stats, collection_statistics
+    with multiprocessing.Pool(params.workers) as pool:
+        map_fn = partial(air_map, params=params, memory_limit=memory_limit)
+        with profile.time("map"):
+            for file_documents in pool.imap(map_fn, enumerate(files)):
+                offsets.append(add_file_statistics(file_documents, documents, statistics))
 
+        doc_lengths, doc_avgtfs = documents.arrays()
+        with profile.time("reduce"):
+            pool.map(partial(air_reduce, offsets=offsets, doc_lengths=doc_lengths, doc_avgtfs=doc_avgtfs),
+                     range(params.segments))
 
-def air_reduce(segment):
-    return create_index(segment)
\ No newline at end of file
+    return documents, statistics
@@ -0,0 +1,384 @@
+import marshal
+import struct
+from itertools import accumulate
+
+import numpy as np
+
+from air18.index.bounds import score_bound_data, write_bounds
+from air18.index.dictionary import DictionaryWriter
+from air18.index.varints import VECTORIZE_THRESHOLD, MAX_VARINT_BYTES, encode_varints, decode_varints, \
+    encode_short_varints, decode_short_varints, read_varint, varint_lengths, cumsum_segments
+
+# marshal format versions >= 3 write back-references for objects shared by identity, which differs between sequential
+# and parallel indexing. Version 2 makes the written bytes depend on the values only.
+MARSHAL_VERSION = 2
+
+# buffer size of postings and block files, so that reads and writes are large even for many small postings lists
+FILE_BUFFER_SIZE = 1 << 20
+
+# maximum number of postings per block of a postings list, lists are only split into blocks with skip entries if they
+# are longer
+SKIP_INTERVAL = 128
+
+# header of a postings record in a binary block file: term length, document frequency, payload length and score bound
+# data length in bytes
+RECORD_HEADER = struct.Struct("<IIII")
+
+
+def encode_postings(docids, tfs, positions=None):
+    """
+    Encode a postings list as varints: the number of postings and of skip entries, the skip entries, interleaved
+    docid gaps and term frequencies, and the positions of the term in every document if they are given. The first
+    docid gap is relative to docid 0, positions are gap encoded within each document.
+
+    Lists longer than SKIP_INTERVAL postings are split into blocks of SKIP_INTERVAL postings with one skip entry per
+    block: the last docid of the block, gap encoded, the lengths in bytes of the postings and positions of the block
+    and its number of postings. Every block can be decoded on its own, see EncodedPostings. Shorter lists have no skip
+    entries.
+
+    :param positions: array of the positions of all postings, ordered by docid and position, or None
+    """
+    if len(docids) <= SKIP_INTERVAL:
+        return encode_short_postings(as_list(docids), as_list(tfs), None if positions is None else as_list(positions))
+
+    docids = np.asarray(docids, dtype=np.int64)
+    tfs = np.asarray(tfs, dtype=np.int64)
+    values = np.empty(2 * len(docids), dtype=np.int64)
+    values[0::2] = np.diff(docids, prepend=0)
+    values[1::2] = tfs
+
+    position_gaps = np.zeros(0, dtype=np.int64)
+    if positions is not None:
+        position_starts = np.cumsum(tfs) - tfs
+        positions = np.asarray(positions, dtype=np.int64)
+        position_gaps = np.diff(positions, prepend=0)
+        position_gaps[position_starts] = positions[position_starts]
+
+    skips = skip_entries(docids, tfs, varint_lengths(values), varint_lengths(position_gaps))
+    return encode_varints(np.concatenate(([len(docids), len(skips)], skips.ravel(), values, position_gaps)))
+
+
+def skip_entries(docids, tfs, value_lengths, position_lengths):
+    """
+    :param value_lengths: encoded length in bytes of every docid gap and term frequency, interleaved
+    :param position_lengths: encoded length in bytes of every position gap, empty without positions
+    :return: array of the skip entries of all blocks of SKIP_INTERVAL postings of a list, see encode_postings
+    """
+    block_starts = np.arange(0, len(docids), SKIP_INTERVAL)
+    skips = np.empty((len(block_starts), 4), dtype=np.int64)
+    skips[:, 0] = np.diff(docids[np.minimum(block_starts + SKIP_INTERVAL, len(docids)) - 1], prepend=0)
+    skips[:, 1] = np.add.reduceat(value_lengths, 2 * block_starts)
+    skips[:, 2] = np.add.reduceat(position_lengths, (np.cumsum(tfs) - tfs)[block_starts]) \
+        if len(position_lengths) > 0 else 0
+    skips[:, 3] = np.minimum(SKIP_INTERVAL, len(docids) - block_starts)
+    return skips
+
+
+def as_list(values):
+    return values.tolist() if isinstance(values, np.ndarray) else list(values)
+
+
+def prepare_postings(docids, tfs):
+    """
+    :return: Tuple (docids, tfs) as lists if there are at most SKIP_INTERVAL postings, which are encoded and summarized
+             without NumPy overhead, and as int64 arrays otherwise
+    """
+    if len(docids) <= SKIP_INTERVAL:
+        return as_list(docids), as_list(tfs)
+    return np.asarray(docids, dtype=np.int64), np.asarray(tfs, dtype=np.int64)
+
+
+def encode_short_postings(docids, tfs, positions):
+    """
+    Like encode_postings, in plain Python for lists of ints without skip entries.
+    """
+    values = [len(docids), 0]
+    previous = 0
+    for docid, tf in zip(docids, tfs):
+        values.append(docid - previous)
+        values.append(tf)
+        previous = docid
+
+    if positions is not None:
+        start = 0
+        for tf in tfs:
+            previous = 0
+            for position in positions[start:start + tf]:
+                values.append(position - previous)
+                previous = position
+            start += tf
+    return encode_varints(values)
+
+
+def decode_short_postings(buffer):
+    """
+    Like decode_positional_postings, in plain Python for a short encoded list. A list shorter than
+    VECTORIZE_THRESHOLD bytes has at most SKIP_INTERVAL postings and therefore no skip entries.
+    """
+    values = decode_short_varints(buffer)
+    end = 2 + 2 * values[0]
+    docids = list(accumulate(values[2:end:2]))
+    tfs = values[3:end:2]
+    positions = None
+    if len(values) > end:
+        positions = []
+        for tf in tfs:
+            positions.extend(accumulate(values[end:end + tf]))
+            end += tf
+    return docids, tfs, positions
+
+
+def decode_header(encoded):
+    """
+    :param encoded: uint8 array of an encoded postings list
+    :return: Tuple (number of postings, skip entries as array of rows (last docid, postings bytes, positions bytes,
+             number of postings), length of the header in bytes)
+    """
+    head = bytes(encoded[:2 * MAX_VARINT_BYTES])
+    num_postings, start = read_varint(head, 0)
+    num_skips, start = read_varint(head, start)
+    if num_skips == 0:
+        return num_postings, np.zeros((0, 4), dtype=np.int64), start
+
+    ends = np.flatnonzero(encoded[start:start + 4 * num_skips * MAX_VARINT_BYTES] < 0x80)
+    end = start + int(ends[4 * num_skips - 1]) + 1
+    skips = decode_varints(encoded[start:end]).reshape(-1, 4)
+    skips[:, 0] = np.cumsum(skips[:, 0])
+    return num_postings, skips, end
+
+
+def decode_postings(buffer):
+    """
+    :return: Tuple (docids, tfs) of int64 arrays
+    """
+    if len(buffer) < VECTORIZE_THRESHOLD:
+        docids, tfs, _ = decode_short_postings(buffer)
+        return np.array(docids, dtype=np.int64), np.array(tfs, dtype=np.int64)
+
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+    num_postings, skips, start = decode_header(encoded)
+    # with skip entries, the positions are not decoded at all
+    end = start + int(skips[:, 1].sum()) if len(skips) > 0 else len(encoded)
+    values = decode_varints(encoded[start:end])[:2 * num_postings]
+    return np.cumsum(values[0::2]), values[1::2]
+
+
+def decode_positional_postings(buffer):
+    """
+    :return: Tuple (docids, tfs, positions) of int64 arrays, positions is None if the list has no positions
+    """
+    if len(buffer) < VECTORIZE_THRESHOLD:
+        docids, tfs, positions = decode_short_postings(buffer)
+        return np.array(docids, dtype=np.int64), np.array(tfs, dtype=np.int64), \
+            None if positions is None else np.array(positions, dtype=np.int64)
+
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+    num_postings, _, start = decode_header(encoded)
+    values = decode_varints(encoded[start:])
+    tfs = values[1:2 * num_postings:2]
+    positions = cumsum_segments(values[2 * num_postings:], tfs) if len(values) > 2 * num_postings else None
+    return np.cumsum(values[0:2 * num_postings:2]), tfs, positions
+
+
+class EncodedPostings:
+    """
+    Access to the postings of selected documents of an encoded postings list. Using the skip entries, only the blocks
+    which can contain the selected documents are decoded, so intersecting a short list with a long one costs about the
+    length of the short list.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.encoded = np.frombuffer(buffer, dtype=np.uint8)
+        self.num_postings, self.skips, self.header_length = decode_header(self.encoded)
+
+    def select(self, docids, positions=False):
+        """
+        :param docids: ascending array of docids
+        :param positions: also return the positions of the selected postings
+        :return: Tuple (docids, tfs) of the postings of all docids contained in the list, with positions as third
+                 element if requested
+        """
+        blocks = self.find_blocks(docids) if len(self.skips) > 0 else None
+        if blocks is not None and len(blocks) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return (empty, empty, empty) if positions else (empty, empty)
+
+        # decoding a whole list at once is cheaper than slicing out most of its blocks
+        if blocks is not None and 2 * len(blocks) <= len(self.skips):
+            list_docids, tfs, list_positions = self.decode_blocks(blocks, positions)
+        elif positions:
+            list_docids, tfs, list_positions = decode_positional_postings(self.buffer)
+        else:
+            list_docids, tfs = decode_postings(self.buffer)
+
+        indexes = np.minimum(np.searchsorted(list_docids, docids), len(list_docids) - 1)
+        found = indexes[list_docids[indexes] == docids]
+        if not positions:
+            return list_docids[found], tfs[found]
+
+        if list_positions is None:
+            raise ValueError("The index has been created without positions")
+        keep = np.zeros(len(list_docids), dtype=bool)
+        keep[found] = True
+        return list_docids[found], tfs[found], list_positions[np.repeat(keep, tfs)]
+
+    def find_blocks(self, docids):
+        """
+        :return: ascending array of the numbers of all blocks which can contain any of docids
+        """
+        # a docid can only be contained in the first block whose last docid is not smaller, galloping over the
+        # skip entries is done for all docids at once by a binary search
+        blocks = np.searchsorted(self.skips[:, 0], docids)
+        return np.unique(blocks[blocks < len(self.skips)])
+
+    def decode_blocks(self, blocks, positions=False):
+        """
+        :return: Tuple (docids, tfs, positions) of the postings in blocks, positions is None unless requested
+        """
+        postings_ends = self.header_length + np.cumsum(self.skips[:, 1])
+        postings_starts = postings_ends - self.skips[:, 1]
+        sizes = self.skips[blocks, 3]
+
+        values = decode_varints(np.concatenate([self.encoded[postings_starts[block]:postings_ends[block]]
+                                                for block in blocks.tolist()]))
+        # the first gap of a block is relative to the last docid of the previous block
+        bases = np.where(blocks > 0, self.skips[np.maximum(blocks - 1, 0), 0], 0)
+        docids = np.repeat(bases, sizes) + cumsum_segments(values[0::2], sizes)
+        tfs = values[1::2]
+        if not positions:
+            return docids, tfs, None
+
+        positions_ends = postings_ends[-1] + np.cumsum(self.skips[:, 2])
+        positions_starts = positions_ends - self.skips[:, 2]
+        position_gaps = decode_varints(np.concatenate([self.encoded[positions_starts[block]:positions_ends[block]]
+                                                       for block in blocks.tolist()]))
+        return docids, tfs, cumsum_segments(position_gaps, tfs) if len(position_gaps) > 0 else None
+
+
+def split_encoded_postings(payload):
+    """
+    Split an encoded postings list into its postings and positions without decoding them.
+
+    :param payload: bytes of an encoded postings list
+    :return: Tuple (number of postings, last docid, encoded postings, encoded positions)
+    """
+    num_postings, start = read_varint(payload, 0)
+    num_skips, start = read_varint(payload, start)
+    if num_skips == 0:
+        # the end of the postings is only known after skipping over all of them
+        last_docid = 0
+        end = start
+        for _ in range(num_postings):
+            gap, end = read_varint(payload, end)
+            last_docid += gap
+            _, end = read_varint(payload, end)
+        return num_postings, last_docid, payload[start:end], payload[end:]
+
+    _, skips, start = decode_header(np.frombuffer(payload, dtype=np.uint8))
+    end = start + int(skips[:, 1].sum())
+    return num_postings, int(skips[-1, 0]), payload[start:end], payload[end:]
+
+
+def concatenate_encoded_postings(payloads):
+    """
+    Concatenate encoded postings lists of ascending, disjoint docid ranges into one without re-encoding them. Only
+    the first docid gap of every following list is rewritten relative to the last docid before it, then the postings
+    and positions of all lists are those of the concatenation. The skip entries are computed anew for blocks of
+    SKIP_INTERVAL postings, so the result equals encode_postings of the concatenated list, however it was split.
+    """
+    if len(payloads) == 1:
+        return payloads[0]
+
+    num_postings = 0
+    last_docid = 0
+    postings, positions = [], []
+    for payload in payloads:
+        size, list_last_docid, list_postings, list_positions = split_encoded_postings(payload)
+        if num_postings > 0:
+            first_docid, end = read_varint(list_postings, 0)
+            if first_docid <= last_docid:
+                raise ValueError("Concatenated postings lists must cover ascending, disjoint docid ranges")
+            list_postings = encode_short_varints([first_docid - last_docid]) + list_postings[end:]
+        num_postings += size
+        last_docid = list_last_docid
+        postings.append(list_postings)
+        positions.append(list_positions)
+
+    postings = b"".join(postings)
+    positions = b"".join(positions)
+    if num_postings <= SKIP_INTERVAL:
+        return encode_short_varints([num_postings, 0]) + postings + positions
+
+    # only the lengths of the encoded values are needed besides docids and tfs, the values end at bytes below 0x80
+    encoded_postings = np.frombuffer(postings, dtype=np.uint8)
+    values = decode_varints(encoded_postings)
+    value_lengths = np.diff(np.flatnonzero(encoded_postings < 0x80), prepend=-1)
+    position_lengths = np.diff(np.flatnonzero(np.frombuffer(positions, dtype=np.uint8) < 0x80), prepend=-1)
+    skips = skip_entries(np.cumsum(values[0::2]), values[1::2], value_lengths, position_lengths)
+    return encode_varints(np.concatenate(([num_postings, len(skips)], skips.ravel()))) + postings + positions
+
+
+def write_record(file, token, payload, df, bound_data):
+    token_bytes = token.encode("utf-8")
+    bound_bytes = marshal.dumps(bound_data, MARSHAL_VERSION)
+    file.write(RECORD_HEADER.pack(len(token_bytes), df, len(payload), len(bound_bytes)))
+    file.write(token_bytes)
+    file.write(payload)
+    file.write(bound_bytes)
+
+
+def read_record(file):
+    """
+    Read the next record written by write_record.
+
+    :return: Tuple (token, payload, df, score bound data), or None at the end of the file
+    """
+    header = file.read(RECORD_HEADER.size)
+    if len(header) < RECORD_HEADER.size:
+        return None
+
+    token_length, df, payload_length, bound_length = RECORD_HEADER.unpack(header)
+    token = file.read(token_length).decode("utf-8")
+    payload = file.read(payload_length)
+    return token, payload, df, marshal.loads(file.read(bound_length))
+
+
+class PostingsWriter:
+    """
+    Writes postings lists, added in ascending term order, to a postings file and their position and df to a term
+    dictionary, see air18.index.dictionary. For dynamic pruning, score upper bound data of every list is collected in
+    a bounds file, ordered like the terms, see air18.index.bounds.write_bounds. The bounds are saved when the writer
+    is closed.
+    """
+    def __init__(self, postings_path, dictionary_path, bounds_path, doc_lengths, doc_avgtfs):
+        self.postings_path = postings_path
+        self.dictionary = DictionaryWriter(dictionary_path, buffering=FILE_BUFFER_SIZE)
+        self.bounds_path = bounds_path
+        self.doc_lengths = doc_lengths
+        self.doc_avgtfs = doc_avgtfs
+        self.offset = 0
+        self.bounds = []
+
+    def __enter__(self):
+        self.postings_file = open(self.postings_path, "wb", buffering=FILE_BUFFER_SIZE)
+        self.dictionary.__enter__()
+        return self
+
+    def add(self, token, docids, tfs, positions=None):
+        docids, tfs = prepare_postings(docids, tfs)
+        self.add_encoded(token, encode_postings(docids, tfs, positions), len(docids),
+                         score_bound_data(docids, tfs, self.doc_lengths, self.doc_avgtfs))
+
+    def add_encoded(self, token, payload, df, bound_data):
+        """
+        Add a postings list which has already been encoded, together with its score bound data.
+        """
+        self.dictionary.add(token, self.offset, len(payload), df)
+        self.bounds.append(bound_data)
+        self.postings_file.write(payload)
+        self.offset += len(payload)
+
+    def __exit__(self, *args):
+        self.postings_file.close()
+        self.dictionary.__exit__(*args)
+        write_bounds(self.bounds_path, self.bounds)
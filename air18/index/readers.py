@@ -0,0 +1,250 @@
+import heapq
+import mmap
+import operator
+import threading
+from itertools import groupby
+
+import numpy as np
+
+from air18.index.bounds import BoundsReader
+from air18.index.dictionary import TermDictionary
+from air18.index.impacts import decode_impacts
+from air18.index.increments import load_increments
+from air18.index.map_reduce import segment_key, segment_paths
+from air18.index.postings import decode_postings, EncodedPostings
+from air18.index.shards import load_shards, shard_paths
+from air18.util.paths import SIMPLE_INDEX_PATH, SIMPLE_INDEX_INDEX_PATH, SIMPLE_INDEX_BOUNDS_PATH, SPIMI_INDEX_PATH, \
+    SPIMI_INDEX_INDEX_PATH, SPIMI_INDEX_BOUNDS_PATH
+
+
+class IndexReader:
+    """
+    Read access to a postings file written by PostingsWriter. Postings file and term dictionary are memory-mapped,
+    postings lists are only decoded on request from a zero-copy view of their bytes in the mapped file.
+    """
+    def __init__(self, postings_path, dictionary_path, bounds_path):
+        self.bounds_path = bounds_path
+        self.bounds = None
+        self.dictionary = TermDictionary(dictionary_path)
+
+        with open(postings_path, "rb") as postings_file:
+            # an empty file cannot be mapped
+            if len(self.dictionary) > 0:
+                self.buffer = mmap.mmap(postings_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = b""
+
+    def __contains__(self, term):
+        return term in self.dictionary
+
+    def terms(self):
+        return self.dictionary.terms()
+
+    def prefix(self, prefix):
+        return self.dictionary.prefix(prefix)
+
+    def df(self, term):
+        return self.dictionary.lookup(term)[3]
+
+    def postings(self, term):
+        """
+        :return: Tuple (docids, tfs) of int64 arrays, or None if the term is not contained in any document
+        """
+        entry = self.dictionary.lookup(term)
+        if entry is None:
+            return None
+
+        _, offset, length, _ = entry
+        return decode_postings(np.frombuffer(self.buffer, dtype=np.uint8, count=length, offset=offset))
+
+    def select(self, term, docids, positions=False):
+        """
+        Postings of term in the given documents, decoding only the blocks of the postings list which can contain them.
+
+        :param docids: ascending array of docids
+        :param positions: also return the positions of the term, the index must have been created with positions
+        :return: Tuple (docids, tfs) of all docids which contain term, with positions as third element if requested
+        """
+        entry = self.dictionary.lookup(term)
+        if entry is None:
+            empty = np.zeros(0, dtype=np.int64)
+            return (empty, empty, empty) if positions else (empty, empty)
+
+        _, offset, length, _ = entry
+        encoded = EncodedPostings(np.frombuffer(self.buffer, dtype=np.uint8, count=length, offset=offset))
+        return encoded.select(docids, positions)
+
+    def score_bound_data(self, term):
+        """
+        :return: the score upper bound data of the term like air18.index.bounds.score_bound_data computes it, with the
+                 skyline as arrays
+        """
+        # bounds are only needed for dynamic pruning, so they are mapped on first use
+        if self.bounds is None:
+            self.bounds = BoundsReader(self.bounds_path)
+        return self.bounds[self.dictionary.lookup(term)[0]]
+
+    def close(self):
+        self.dictionary.close()
+        self.bounds = None
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+
+class ImpactIndexReader:
+    """
+    Read access to an impact index written by air18.index.impacts.write_impacts, memory-mapped like IndexReader.
+    """
+    def __init__(self, impact_index):
+        postings_path, dictionary_path = impact_index.paths()
+        self.dictionary = TermDictionary(dictionary_path)
+        with open(postings_path, "rb") as postings_file:
+            if len(self.dictionary) > 0:
+                self.buffer = mmap.mmap(postings_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffer = b""
+
+    def __contains__(self, term):
+        return term in self.dictionary
+
+    def segments(self, term):
+        """
+        :return: Tuple (scores, counts, docids) of the impact segments of term, see air18.index.impacts.decode_impacts,
+                 or None if the term is not contained in any document
+        """
+        entry = self.dictionary.lookup(term)
+        if entry is None:
+            return None
+
+        _, offset, length, _ = entry
+        return decode_impacts(np.frombuffer(self.buffer, dtype=np.uint8, count=length, offset=offset))
+
+    def close(self):
+        self.dictionary.close()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+
+class SegmentedIndexReader:
+    """
+    Read access to the term partitioned segments of the map_reduce method. Segments are opened when a term of them is
+    requested for the first time.
+    """
+    def __init__(self, num_segments):
+        self.num_segments = num_segments
+        self.segments = {}
+        self.lock = threading.Lock()
+
+    def open_segment(self, key):
+        if key not in self.segments:
+            # segments may be requested concurrently by the query server
+            with self.lock:
+                if key not in self.segments:
+                    self.segments[key] = IndexReader(*segment_paths(key))
+        return self.segments[key]
+
+    def segment(self, term):
+        return self.open_segment(segment_key(term, self.num_segments))
+
+    def __contains__(self, term):
+        return term in self.segment(term)
+
+    def terms(self):
+        return heapq.merge(*(self.open_segment(key).terms() for key in range(self.num_segments)))
+
+    def df(self, term):
+        return self.segment(term).df(term)
+
+    def postings(self, term):
+        return self.segment(term).postings(term)
+
+    def select(self, term, docids, positions=False):
+        return self.segment(term).select(term, docids, positions)
+
+    def prefix(self, prefix):
+        # terms with a common prefix are spread over all segments
+        return heapq.merge(*(self.open_segment(key).prefix(prefix) for key in range(self.num_segments)))
+
+    def score_bound_data(self, term):
+        return self.segment(term).score_bound_data(term)
+
+    def close(self):
+        for segment in self.segments.values():
+            segment.close()
+
+
+class ConcatenatedIndexReader:
+    """
+    Read access to several indexes of ascending, disjoint docid ranges, like an index and the increments appended to
+    it or the shards of a sharded index. The postings list of a term is the concatenation of its postings lists in all
+    of them.
+    """
+    def __init__(self, readers):
+        self.readers = readers
+
+    def __contains__(self, term):
+        return any(term in reader for reader in self.readers)
+
+    def terms(self):
+        return (term for term, _ in groupby(heapq.merge(*(reader.terms() for reader in self.readers))))
+
+    def df(self, term):
+        return sum(reader.df(term) for reader in self.readers if term in reader)
+
+    def postings(self, term):
+        postings = [reader.postings(term) for reader in self.readers if term in reader]
+        if not postings:
+            return None
+        return np.concatenate([docids for docids, _ in postings]), np.concatenate([tfs for _, tfs in postings])
+
+    def select(self, term, docids, positions=False):
+        # every reader only decodes the blocks which can contain docids of its own range
+        selected = [reader.select(term, docids, positions) for reader in self.readers]
+        return tuple(np.concatenate(arrays) for arrays in zip(*selected))
+
+    def prefix(self, prefix):
+        for term, term_dfs in groupby(heapq.merge(*(reader.prefix(prefix) for reader in self.readers)),
+                                      key=operator.itemgetter(0)):
+            yield term, sum(df for _, df in term_dfs)
+
+    def score_bound_data(self, term):
+        # the bound of the union of all score skylines with the smallest avgtf holds for every part
+        bound_data = [reader.score_bound_data(term) for reader in self.readers if term in reader]
+        return (min(min_avgtf for min_avgtf, _, _ in bound_data), np.concatenate([tfs for _, tfs, _ in bound_data]),
+                np.concatenate([dls for _, _, dls in bound_data]))
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+
+def open_method_index(index_params):
+    if index_params.indexing_method == "map_reduce":
+        return SegmentedIndexReader(index_params.segments)
+    elif index_params.indexing_method == "simple":
+        return IndexReader(SIMPLE_INDEX_PATH, SIMPLE_INDEX_INDEX_PATH, SIMPLE_INDEX_BOUNDS_PATH)
+    elif index_params.indexing_method == "spimi":
+        return IndexReader(SPIMI_INDEX_PATH, SPIMI_INDEX_INDEX_PATH, SPIMI_INDEX_BOUNDS_PATH)
+    else:
+        raise ValueError("Encountered unsupported index type {}".format(index_params.indexing_method))
+
+
+def open_base_index(index_params):
+    """
+    Open the index created with the given indexing params, or all its shards if it has been sharded.
+    """
+    shards = load_shards()
+    if not shards:
+        return open_method_index(index_params)
+    return ConcatenatedIndexReader([IndexReader(*shard_paths(shardno)) for shardno in range(len(shards))])
+
+
+def open_index(index_params):
+    """
+    Open the index created with the given indexing params, including all live increments, for reading.
+    """
+    index = open_base_index(index_params)
+    increments = load_increments()
+    if not increments:
+        return index
+    return ConcatenatedIndexReader([index] + [IndexReader(*increment.paths()) for increment in increments])
@@ -0,0 +1,73 @@
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from air18.index.statistics import CollectionStatistics
+
+# All similarity functions work on scalars as well as on NumPy arrays of a whole postings list, in which case tf_td,
+# dl and avgtf are arrays aligned with the docids of the postings list.
+
+
+def tf_idf(tf_td, idf_t, collection_statistics: CollectionStatistics, **kwargs):
+    return np.log(1 + tf_td) * idf_t
+
+
+def bm25(tf_td, idf_t, collection_statistics: CollectionStatistics, k1: float,
+         b: float, dl: int, **kwargs):
+    B = (1 - b + b * dl / collection_statistics.avgdl)
+    return idf_t * tf_td * (k1 + 1) / (tf_td + k1 * B)
+
+
+def bm25_verboseness_fission(tf_td, idf_t, collection_statistics: CollectionStatistics,
+                             k1, dl, avgtf, **kwargs):
+    b = collection_statistics.b_verboseness_fission
+    BVa = (1 - b) * (avgtf / collection_statistics.mavgtf )+ b * (dl / collection_statistics.avgdl)
+    return idf_t * tf_td * (k1 + 1) / (tf_td + k1 * BVa)
+
+
+similarity_functions = {
+    "tf-idf": tf_idf,
+    "bm25": bm25,
+    "bm25va": bm25_verboseness_fission,
+}
+
+# parameters of the similarity functions and their default values
+default_parameters = {
+    "tf-idf": {},
+    "bm25": {"b": 0.25, "k1": 1.5},
+    "bm25va": {"k1": 1.5},
+}
+
+# a scoring configuration: name of the run, similarity function name and its parameters
+Run = namedtuple("Run", ["name", "similarity", "parameters"])
+
+
+def parse_run(spec):
+    """
+    Parse a scoring configuration like "bm25" or "bm25:k1=1.2,b=0.75". Parameters which are not given keep their
+    default values. The run is named after the specification.
+    """
+    similarity, _, parameter_spec = spec.partition(":")
+    if similarity not in similarity_functions:
+        raise ValueError("Unknown similarity function {}".format(similarity))
+
+    parameters = dict(default_parameters[similarity])
+    for assignment in filter(None, parameter_spec.split(",")):
+        name, _, value = assignment.partition("=")
+        if name not in parameters:
+            raise ValueError("Similarity function {} has no parameter {}".format(similarity, name))
+        parameters[name] = float(value)
+
+    name = spec.replace(":", "_").replace(",", "_")
+    return Run(name, similarity, parameters)
+
+
+def run_spec(spec):
+    """
+    argparse type of options taking scoring configurations, see parse_run.
+    """
+    try:
+        return parse_run(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
@@ -0,0 +1,79 @@
+import os
+import pickle
+from contextlib import ExitStack
+
+import numpy as np
+
+from air18.index.map_reduce import segment_paths
+from air18.index.postings import PostingsWriter
+from air18.util.paths import INDEX_BASE, SHARDS_FILEPATH, SIMPLE_INDEX_PATH, SIMPLE_INDEX_INDEX_PATH, \
+    SIMPLE_INDEX_BOUNDS_PATH, SPIMI_INDEX_PATH, SPIMI_INDEX_INDEX_PATH, SPIMI_INDEX_BOUNDS_PATH
+
+
+def shard_paths(shardno):
+    """
+    :return: Tuple (postings path, dictionary path, bounds path) of a shard
+    """
+    name = os.path.join(INDEX_BASE, "shard_{}".format(shardno))
+    return name + ".bin", name + "_dictionary.bin", name + "_bounds.bin"
+
+
+def method_index_paths(index_params):
+    """
+    :return: list of all files of the index written by the indexing method
+    """
+    if index_params.indexing_method == "map_reduce":
+        return [path for key in range(index_params.segments) for path in segment_paths(key)]
+    elif index_params.indexing_method == "simple":
+        return [SIMPLE_INDEX_PATH, SIMPLE_INDEX_INDEX_PATH, SIMPLE_INDEX_BOUNDS_PATH]
+    elif index_params.indexing_method == "spimi":
+        return [SPIMI_INDEX_PATH, SPIMI_INDEX_INDEX_PATH, SPIMI_INDEX_BOUNDS_PATH]
+    else:
+        raise ValueError("Encountered unsupported index type {}".format(index_params.indexing_method))
+
+
+def load_shards():
+    """
+    :return: list of Tuples (first docid, end docid) of all shards, empty if the index is not sharded
+    """
+    if not os.path.isfile(SHARDS_FILEPATH):
+        return []
+    with open(SHARDS_FILEPATH, "rb") as shards_file:
+        return pickle.load(shards_file)
+
+
+def shard_ranges(doc_lengths, num_shards):
+    """
+    Split the docids into num_shards contiguous ranges holding about the same number of tokens, so that scoring a
+    query takes about the same time in every shard.
+
+    :return: list of Tuples (first docid, end docid)
+    """
+    cumulative = np.cumsum(doc_lengths)
+    total = cumulative[-1] if len(cumulative) > 0 else 0
+    ends = np.searchsorted(cumulative, total * np.arange(1, num_shards) / num_shards, side="right").tolist()
+    edges = [0] + ends + [len(doc_lengths)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def write_shards(index, ranges, doc_lengths, doc_avgtfs):
+    """
+    Split every postings list of index by the docid ranges of the shards and write one index per shard. Docids stay
+    global, so the shards are read like increments of one index.
+
+    :param index: reader of the index to split, see air18.index.readers
+    :param ranges: list of Tuples (first docid, end docid) of the shards, see shard_ranges
+    """
+    boundaries = np.array([first for first, _ in ranges[1:]], dtype=np.int64)
+    with ExitStack() as stack:
+        writers = [stack.enter_context(PostingsWriter(*shard_paths(shardno), doc_lengths, doc_avgtfs))
+                   for shardno in range(len(ranges))]
+        for term in index.terms():
+            docids, tfs = index.postings(term)
+            splits = np.searchsorted(docids, boundaries)
+            for writer, shard_docids, shard_tfs in zip(writers, np.split(docids, splits), np.split(tfs, splits)):
+                if len(shard_docids) > 0:
+                    writer.add(term, shard_docids, shard_tfs)
+
+    with open(SHARDS_FILEPATH, "wb") as shards_file:
+        pickle.dump(ranges, shards_file)
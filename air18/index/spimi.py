@@ -1,42 +1,27 @@
+import collections
 import heapq
-import marshal
 import operator
 import os
-from functools import reduce
 from itertools import groupby
 
-import more_itertools
+import numpy as np
 
-from air18.index.common import create_index
-from air18.util.paths import INDEX_BASE, SPIMI_INDEX_PATH, SPIMI_INDEX_INDEX_PATH
+from air18.index.bounds import score_bound_data, merge_score_bound_data
+from air18.index.common import TERM_MEMORY, POSTING_MEMORY, POSITION_MEMORY
+from air18.index.postings import encode_postings, prepare_postings, concatenate_encoded_postings, write_record, \
+    read_record, PostingsWriter, FILE_BUFFER_SIZE
+from air18.util.paths import INDEX_BASE, SPIMI_INDEX_PATH, SPIMI_INDEX_INDEX_PATH, SPIMI_INDEX_BOUNDS_PATH
 from air18.util.progress import ProgressBar
 
-# results in block files of about 50 MB and 3 GB of peak memory usage
-BLOCK_SIZE = 10000000
-
-
-def block_line(token, docid_tfs):
-    return token + ":" + ",".join(("%s-%s" % docid_tf for docid_tf in docid_tfs)) + "\n"
-
-
-def from_block_line(line):
-    if line == "":
-        return None
-
-    split_line = line.split(":")
-    token = split_line[0]
-    docid_tfs = [tuple(int(t) for t in docid_tf.split("-")) for docid_tf in split_line[1].split(",")]
-    return token, docid_tfs
-
 
 class BlockFile:
     def __init__(self, blocknumber, mode="rb"):
-        self.filename = os.path.join(INDEX_BASE, "spimi_tmp_index_{}.txt".format(blocknumber))
+        self.filename = os.path.join(INDEX_BASE, "spimi_tmp_index_{}.bin".format(blocknumber))
         self.blocknumber = blocknumber
         self.mode = mode
 
     def open(self):
-        self.block_file = open(self.filename, self.mode)
+        self.block_file = open(self.filename, self.mode, buffering=FILE_BUFFER_SIZE)
         return self.block_file
 
     def __enter__(self):
@@ -47,71 +32,154 @@ class BlockFile:
         self.block_file.close()
 
 
-def save_spimi_blocks(doc_tokens):
-    blocks = more_itertools.chunked(doc_tokens, BLOCK_SIZE)
-    block_indexes = (sorted(create_index(block).items(), key=operator.itemgetter(0)) for block in blocks)
-
+def write_spimi_block(blockno, block_index, documents):
+    """
+    Write the postings lists of a block in token order, encoded like in the final index and with their score bound
+    data, so that merge_spimi_blocks does not need to decode them.
+
+    :param documents: DocumentStore which contains all documents of the block
+    """
+    doc_lengths, doc_avgtfs = documents.arrays()
+    with BlockFile(blockno, mode="wb") as index_file:
+        for token, postings in sorted(block_index.items(), key=operator.itemgetter(0)):
+            docids, tfs, *positions = zip(*postings)
+            positions = np.concatenate(positions[0]) if positions else None
+            docids, tfs = prepare_postings(docids, tfs)
+            write_record(index_file, token, encode_postings(docids, tfs, positions), len(docids),
+                         score_bound_data(docids, tfs, doc_lengths, doc_avgtfs))
+
+
+def document_postings(tokens, positions):
+    """
+    :param tokens: list of the tokens of a document in document order
+    :return: iterator over Tuples (token, tf) of the document, with the positions of the token as third element if
+             positions is set
+    """
+    if not positions:
+        return collections.Counter(tokens).items()
+
+    token_positions = collections.defaultdict(list)
+    for position, token in enumerate(tokens):
+        token_positions[token].append(position)
+    return ((token, len(document_positions), document_positions)
+            for token, document_positions in token_positions.items())
+
+
+def save_spimi_blocks(doc_tokens, documents, memory_limit, positions=False):
+    """
+    Invert the token stream into blocks of postings lists, counting term frequencies per document. A block is written
+    whenever its estimated memory footprint exceeds memory_limit bytes, always at a document boundary.
+
+    :param doc_tokens: iterable of Tuples (docid, token), grouped by docid and in document order
+    :param documents: DocumentStore to which the stream adds every document once all of its tokens have been read
+    :param positions: also store the positions of the tokens within their documents
+    :return: the number of written blocks
+    """
     num_blocks = 0
-    for blockno, block_index in enumerate(block_indexes, 1):
-        with BlockFile(blockno, mode="w") as index_file:
-            for token, docid_tfs in block_index:
-                index_file.write(block_line(token, docid_tfs))
-        num_blocks = blockno
+    block_index = {}
+    memory = 0
+    for docid, tokens in groupby(doc_tokens, key=operator.itemgetter(0)):
+        tokens = [token for _, token in tokens]
+        for token, tf, *token_positions in document_postings(tokens, positions):
+            postings = block_index.get(token)
+            if postings is None:
+                postings = block_index[token] = []
+                memory += TERM_MEMORY + len(token)
+            postings.append((docid, tf, *token_positions))
+            memory += POSTING_MEMORY
+        if positions:
+            memory += POSITION_MEMORY * len(tokens)
+
+        if memory >= memory_limit:
+            num_blocks += 1
+            write_spimi_block(num_blocks, block_index, documents)
+            block_index = {}
+            memory = 0
+
+    if block_index:
+        num_blocks += 1
+        write_spimi_block(num_blocks, block_index, documents)
 
     return num_blocks
 
 
-def merge_spimi_blocks(num_blocks):
-    def merge_postings(p1, p2):
-        # Merges sorted inputs into a single sorted output.
-        # a posting is a tuple of docid, tf_td
-        merged_postings_with_dup = heapq.merge(p1[1], p2[1], key=operator.itemgetter(0))
-        merged_postings = [(docid, sum((tf for _, tf in docid_tfs)))
-                           for docid, docid_tfs in groupby(merged_postings_with_dup, key=operator.itemgetter(0))]
-        return p1[0], merged_postings
-
-    block_files = {blockno: BlockFile(blockno, mode="r").open() for blockno in range(1, num_blocks + 1)}
-
-    # load first line from all blocks
-    blocks = dict()
-    for no, file in block_files.items():
-        blocks[no] = from_block_line(file.readline())
-
-    meta_index = {}
-    progressbar = ProgressBar("Merging index blocks")
-    with open(SPIMI_INDEX_PATH, mode="w") as index_file:
-        while blocks:
-            # get posting lists of smallest token from blocks, merge them if more than one posting list
-            min_token = min((posting[0] for posting in blocks.values()))
-            min_token_blocknos = (no for no, posting in blocks.items() if posting[0] == min_token)
-            min_token_postings = (posting for posting in blocks.values() if posting[0] == min_token)
-            merged_posting = reduce(merge_postings, min_token_postings)
-
-            progressbar.update(min_token)
-
-            # add index file offset for term to meta index
-            meta_index[min_token] = index_file.tell()
+def save_spimi_blocks_from_indexes(partial_indexes, documents, memory_limit):
+    """
+    Like save_spimi_blocks, but for already inverted partial indexes of ascending docid ranges, as produced by
+    create_partial_index_stream. Partial indexes are concatenated until a block exceeds memory_limit bytes, so blocks
+    end at other documents than in save_spimi_blocks. The merged index is the same, as merge_spimi_blocks does not
+    keep the block boundaries in the postings lists.
+    """
+    num_blocks = 0
+    block_index = {}
+    memory = 0
+    for partial_index in partial_indexes:
+        for token, docid_tfs in partial_index.items():
+            postings = block_index.get(token)
+            if postings is None:
+                postings = block_index[token] = []
+                memory += TERM_MEMORY + len(token)
+            postings.extend(docid_tfs)
+            memory += POSTING_MEMORY * len(docid_tfs)
+
+        if memory >= memory_limit:
+            num_blocks += 1
+            write_spimi_block(num_blocks, block_index, documents)
+            block_index = {}
+            memory = 0
+
+    if block_index:
+        num_blocks += 1
+        write_spimi_block(num_blocks, block_index, documents)
 
-            # save merged postings list to index file
-            index_file.write(block_line(*merged_posting))
+    return num_blocks
 
-            # reload line from all written out blocks and remove EOF blocks from dictionary
-            for no in min_token_blocknos:
-                blocks[no] = None
 
-            for no, file in block_files.items():
-                if no in blocks and blocks[no] is None:
-                    blocks[no] = from_block_line(file.readline())
-                    if blocks[no] is None:
-                        del blocks[no]
+def merge_spimi_blocks(num_blocks, doc_lengths, doc_avgtfs):
+    """
+    k-way merge of all blocks with a heap of the next postings list of every block, ordered by token and block
+    number. Blocks cover ascending docid ranges and never split documents, so the encoded postings lists of a token
+    are concatenated in block order without decoding them, and their score bound data is merged.
+    """
+    block_files = [BlockFile(blockno, mode="rb").open() for blockno in range(1, num_blocks + 1)]
+
+    # heap entries (token, block index, record), block indexes are unique so records are never compared
+    heap = []
+    for no, block_file in enumerate(block_files):
+        head = read_record(block_file)
+        if head is not None:
+            heap.append((head[0], no, head))
+    heapq.heapify(heap)
+
+    # progress is measured in bytes read from the block files
+    progressbar = ProgressBar("Merging index blocks", sum(os.path.getsize(f.name) for f in block_files))
+    consumed = sum(block_file.tell() for block_file in block_files)
+    with PostingsWriter(SPIMI_INDEX_PATH, SPIMI_INDEX_INDEX_PATH, SPIMI_INDEX_BOUNDS_PATH, doc_lengths,
+                        doc_avgtfs) as writer:
+        while heap:
+            # pop the postings lists of the smallest token from all blocks, ties are popped in block order
+            token = heap[0][0]
+            records = []
+            while heap and heap[0][0] == token:
+                _, no, record = heapq.heappop(heap)
+                records.append(record)
+
+                position = block_files[no].tell()
+                head = read_record(block_files[no])
+                consumed += block_files[no].tell() - position
+                if head is not None:
+                    heapq.heappush(heap, (head[0], no, head))
+
+            progressbar.update(consumed)
+
+            # save concatenated postings list to index file and its position to the term dictionary
+            writer.add_encoded(token, concatenate_encoded_postings([payload for _, payload, _, _ in records]),
+                               sum(df for _, _, df, _ in records),
+                               merge_score_bound_data([bound_data for *_, bound_data in records]))
 
     progressbar.finish()
 
-    # save meta index
-    with open(SPIMI_INDEX_INDEX_PATH, mode="wb") as index_index_file:
-        marshal.dump(meta_index, index_index_file)
-
     # remove intermediate SPIMI files
-    for block_file in block_files.values():
+    for block_file in block_files:
         block_file.close()
-        os.remove(block_file.name)
\ No newline at end of file
+        os.remove(block_file.name)
@@ -1,33 +1,86 @@
+import functools
 import re
+from itertools import filterfalse
 
 import porterstemmer
 from nltk import WordNetLemmatizer
 
+# tokenize, simple strategy:
+# split on all non-alphanumeric characters
+# plus some adjustments for special word handling (email, strings with hyphens)
+TOKEN_SPLIT_REGEX = re.compile(r'[^a-zA-Z0-9.@]|\.[^a-zA-Z0-9]|\.$')
 
-def air_tokenize(text, case_folding=False, stop_words=False, stemming=False, lemmatization=False):
-    # tokenize, simple strategy:
-    # split on all non-alphanumeric characters
-    # plus some adjustments for special word handling (email, strings with hyphens)
-    tokens = re.split('[^a-zA-Z0-9.@]|\.[^a-zA-Z0-9]|\.$', text)
-    tokens = filter(None, tokens)
+# maximum number of memoized surface form -> term normalizations
+NORMALIZATION_CACHE_SIZE = 2 ** 18
 
-    # case folding, simple strategy: all words to lowercase
-    if case_folding:
-        tokens = map(str.lower, tokens)
 
-    # removing stop words
-    if stop_words:
-        from air18.index.stopwords import stop_words_en
-        tokens = filter(lambda token: token not in stop_words_en, tokens)
+class Tokenizer:
+    """
+    Tokenization pipeline which is set up once and then applied to many texts. Case folding and stop word removal
+    are applied in the same pass over the tokens. Since the vocabulary is Zipfian, stemming and lemmatization results
+    are memoized per surface form in a bounded LRU cache.
+    """
+    def __init__(self, case_folding=False, stop_words=False, stemming=False, lemmatization=False,
+                 cache_size=NORMALIZATION_CACHE_SIZE):
+        self.case_folding = case_folding
 
-    # stemming
-    if stemming:
-        stemmer = porterstemmer.Stemmer()
-        tokens = map(stemmer, tokens)
+        if stop_words:
+            from air18.index.stopwords import stop_words_en
+            self.stop_words = stop_words_en
+        else:
+            self.stop_words = None
 
-    # lemmatization
-    if lemmatization:
-        lemmatizer = WordNetLemmatizer()
-        tokens = map(lemmatizer.lemmatize, tokens)
+        normalizers = []
+        if stemming:
+            normalizers.append(porterstemmer.Stemmer())
+        if lemmatization:
+            normalizers.append(WordNetLemmatizer().lemmatize)
 
-    return tokens
\ No newline at end of file
+        if normalizers:
+            def normalize(token):
+                for normalizer in normalizers:
+                    token = normalizer(token)
+                return token
+            self.normalize = functools.lru_cache(maxsize=cache_size)(normalize)
+        else:
+            self.normalize = None
+
+    def __call__(self, text):
+        """
+        :return: list of terms of text
+        """
+        # all steps are chained iterators, so every token passes through the whole pipeline in a single pass
+        tokens = filter(None, TOKEN_SPLIT_REGEX.split(text))
+
+        # case folding, simple strategy: all words to lowercase
+        if self.case_folding:
+            tokens = map(str.lower, tokens)
+
+        # removing stop words
+        if self.stop_words:
+            tokens = filterfalse(self.stop_words.__contains__, tokens)
+
+        # stemming and lemmatization
+        if self.normalize is not None:
+            tokens = map(self.normalize, tokens)
+
+        return list(tokens)
+
+    def cache_info(self):
+        """
+        :return: hit and miss statistics of the normalization cache, or None if there is no normalization
+        """
+        return self.normalize.cache_info() if self.normalize is not None else None
+
+
+@functools.lru_cache(maxsize=None)
+def cached_tokenizer(case_folding, stop_words, stemming, lemmatization):
+    return Tokenizer(case_folding, stop_words, stemming, lemmatization)
+
+
+def get_tokenizer(params):
+    """
+    :param params: index settings
+    :return: the tokenizer for the index settings, created once per process so that its cache is shared
+    """
+    return cached_tokenizer(params.case_folding, params.stop_words, params.stemming, params.lemmatization)
@@ -0,0 +1,126 @@
+import numpy as np
+
+# maximum number of bytes of a variable-byte encoded 64 bit integer
+MAX_VARINT_BYTES = 10
+
+# below this number of values to encode or bytes to decode, plain Python loops are faster than the fixed overhead of
+# the NumPy calls, which would dominate indexing time for the many short postings lists of a collection
+VECTORIZE_THRESHOLD = 256
+
+
+def varint_lengths(values):
+    """
+    :return: int64 array of the number of bytes of every value when variable-byte encoded
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    num_bytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, MAX_VARINT_BYTES):
+        num_bytes += values >= np.uint64(1 << (7 * k))
+    return num_bytes
+
+
+def encode_varints(values):
+    """
+    Variable-byte encode non-negative integers. Every byte holds 7 bits of the value, least significant group first,
+    the high bit is set on all but the last byte of a value.
+    """
+    if len(values) < VECTORIZE_THRESHOLD:
+        return encode_short_varints(values.tolist() if isinstance(values, np.ndarray) else values)
+
+    values = np.asarray(values, dtype=np.uint64)
+    num_bytes = varint_lengths(values)
+
+    ends = np.cumsum(num_bytes)
+    starts = ends - num_bytes
+    encoded = np.empty(ends[-1] if len(ends) > 0 else 0, dtype=np.uint8)
+    for k in range(int(num_bytes.max(initial=0))):
+        mask = num_bytes > k
+        groups = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        continuation = np.where(num_bytes[mask] - 1 > k, 0x80, 0)
+        encoded[starts[mask] + k] = groups.astype(np.uint8) | continuation.astype(np.uint8)
+
+    return encoded.tobytes()
+
+
+def decode_varints(buffer):
+    """
+    Decode all variable-byte encoded integers in buffer at once.
+
+    :param buffer: bytes-like object or uint8 array
+    :return: int64 array of decoded values
+    """
+    if len(buffer) < VECTORIZE_THRESHOLD:
+        return np.array(decode_short_varints(buffer), dtype=np.int64)
+
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+    if len(encoded) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    last_bytes = encoded < 0x80
+    starts = np.flatnonzero(np.concatenate(([True], last_bytes[:-1])))
+
+    # position of every byte within its value
+    value_index = np.cumsum(last_bytes) - last_bytes
+    shifts = (np.arange(len(encoded)) - starts[value_index]) * 7
+
+    groups = (encoded & 0x7f).astype(np.int64) << shifts
+    return np.bitwise_or.reduceat(groups, starts)
+
+
+def encode_short_varints(values):
+    """
+    Like encode_varints, in plain Python for a short sequence of ints.
+    """
+    encoded = bytearray()
+    for value in values:
+        while value >= 0x80:
+            encoded.append(value & 0x7f | 0x80)
+            value >>= 7
+        encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_short_varints(buffer):
+    """
+    Like decode_varints, in plain Python for a short buffer.
+
+    :return: list of decoded values
+    """
+    values = []
+    value = shift = 0
+    for byte in bytes(buffer):
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            values.append(value)
+            value = shift = 0
+        else:
+            shift += 7
+    return values
+
+
+def read_varint(buffer, position):
+    """
+    :param buffer: bytes object
+    :return: Tuple (value of the varint starting at position, position after it)
+    """
+    value = shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def cumsum_segments(gaps, counts):
+    """
+    Undo gap encoding separately within consecutive segments of gaps, the first gap of every segment is relative to 0.
+
+    :param counts: number of gaps of every segment
+    :return: int64 array of the decoded values
+    """
+    sums = np.cumsum(gaps)
+    ends = np.cumsum(counts)
+    before = np.concatenate(([0], sums[ends[:-1] - 1])) if len(ends) > 0 else np.zeros(0, dtype=np.int64)
+    return sums - np.repeat(before, counts)
@@ -1,20 +1,18 @@
 #!/usr/bin/env python3
 
 import argparse
-import marshal
-import operator
-import pickle
-
-import itertools
+import os
 import sys
-from collections import defaultdict
-from math import log
 
-from air18.search import score
-from air18.index.map_reduce import segment_keys, SegmentFile
-from air18.util.parsing import parse_topics
-from air18.util.paths import *
-from air18.index.spimi import from_block_line
+from air18.eval.qrels import Qrels
+from air18.index import score
+from air18.search.boolean import QUERY_MODES
+from air18.search.jobs import map_topics
+from air18.search.searcher import Searcher, trec_lines, POSTINGS_CACHE_SIZE, RESULT_CACHE_SIZE
+from air18.search.server import serve
+from air18.search.sweep import sweep
+from air18.util.paths import DEFAULT_TOPIC_FILE, DEFAULT_QRELS_FILE
+from air18.util.profiling import profile
 
 
 def parse_args():
@@ -30,6 +28,29 @@ def parse_args():
                         help="Arbitrary string which will be contained in the TREC output as an identifier of the run")
     parser.add_argument("--topic", default=None, help="Query only for one given topic instead of all")
     parser.add_argument("--debug", "-d", action="store_true", help="Print debug output")
+    parser.add_argument("--postings-cache", type=int, default=POSTINGS_CACHE_SIZE,
+                        help="Memory budget in MB for decoded postings lists of recently used terms, 0 disables it")
+    parser.add_argument("--result-cache", type=int, default=RESULT_CACHE_SIZE,
+                        help="Number of recent query results to keep, 0 disables it")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print a JSON report of index loading time, per-topic latencies and counters to stderr")
+    parser.add_argument("--pruning", action="store_true",
+                        help="Use MaxScore dynamic pruning to skip documents which cannot enter the top --show "
+                             "documents. The results are the same as without pruning")
+    parser.add_argument("--shard-workers", type=int, default=None,
+                        help="Number of processes scoring the shards of a sharded index in parallel, by default one "
+                             "per shard up to the number of CPUs. 1 searches all shards in the main process")
+    parser.add_argument("--mode", choices=QUERY_MODES, default="or",
+                        help="Return documents containing any topic term (or), all of them (and) or all of them "
+                             "consecutively in topic order (phrase, needs an index created with --positions)")
+    parser.add_argument("--impacts", action="store_true",
+                        help="Search the impact index precomputed for the similarity function and its parameters "
+                             "score-at-a-time, see the --impacts option of air18.index. Scores are approximate")
+    parser.add_argument("--budget", type=int, default=None,
+                        help="With --impacts, stop after this many postings per topic, highest impacts first")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Number of worker processes searching topics in parallel. Workers share the loaded index, "
+                             "the output order does not change. Shards are then searched within each worker")
 
     subparsers = parser.add_subparsers(dest="similarity_function", title="similarity function")
     subparsers.required = True
@@ -38,134 +59,168 @@ def parse_args():
     tf_idf_parser.set_defaults(scoring_function=score.tf_idf)
 
     bm25_parser = subparsers.add_parser("bm25", help="use BM25")
-    bm25_parser.add_argument("--b", type=float, default=0.25, help="b parameter")
-    bm25_parser.add_argument("--k1", type=float, default=1.5, help="k1 parameter")
+    bm25_parser.add_argument("--b", type=float, default=score.default_parameters["bm25"]["b"], help="b parameter")
+    bm25_parser.add_argument("--k1", type=float, default=score.default_parameters["bm25"]["k1"], help="k1 parameter")
     bm25_parser.set_defaults(scoring_function=score.bm25)
 
     bm25va_parser = subparsers.add_parser("bm25va", help="use BM25 Verboseness Fission Variant")
-    bm25va_parser.add_argument("--k1", type=float, default=1.5, help="k1 parameter")
+    bm25va_parser.add_argument("--k1", type=float, default=score.default_parameters["bm25va"]["k1"],
+                               help="k1 parameter")
     bm25va_parser.set_defaults(scoring_function=score.bm25_verboseness_fission)
 
-    return parser.parse_args()
-
-
-def print_output(topic_id, sorted_scores, run_name, max_docs_per_topic):
-    for rank, (docid, score) in enumerate(itertools.islice(sorted_scores, max_docs_per_topic)):
-        print("{topic_id} Q0 {document_id} {rank} {score} {run_name}".format(
-            topic_id=topic_id, document_id=docid, rank=rank, score=score,
-            run_name=run_name
-        ))
+    batch_parser = subparsers.add_parser("batch", help="evaluate several scoring configurations in one pass over the "
+                                                       "postings and write one TREC file per run")
+    batch_parser.add_argument("--runs", type=score.run_spec, nargs="+", required=True,
+                              help="Scoring configurations like tf-idf, bm25:k1=1.2,b=0.75 or bm25va:k1=1.5")
+    batch_parser.add_argument("--output-dir", default=".",
+                              help="Directory to which the TREC file <run>.trec of each run is written")
+    batch_parser.set_defaults(scoring_function=None)
+
+    sweep_parser = subparsers.add_parser("sweep", help="grid search of the BM25 parameters k1 and b, evaluated by MAP "
+                                                       "against relevance judgments")
+    sweep_parser.add_argument("--k1", type=float, nargs="+", default=[0.6, 0.9, 1.2, 1.5, 1.8],
+                              help="k1 values of the grid")
+    sweep_parser.add_argument("--b", type=float, nargs="+", default=[0.25, 0.5, 0.75, 1.0],
+                              help="b values of the grid")
+    sweep_parser.add_argument("--qrels", type=argparse.FileType(), default=DEFAULT_QRELS_FILE,
+                              help="Relevance judgments in TREC format")
+    sweep_parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                              help="Number of worker processes evaluating grid points in parallel")
+    sweep_parser.set_defaults(scoring_function=None)
+
+    serve_parser = subparsers.add_parser("serve", help="keep the index loaded and answer queries over HTTP, the "
+                                                       "similarity function is chosen per query")
+    serve_parser.add_argument("--host", default="localhost", help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=8018, help="Port to listen on")
+    serve_parser.set_defaults(scoring_function=None)
+
+    params = parser.parse_args()
+    if params.impacts and params.mode != "or":
+        parser.error("--impacts only supports --mode or")
+    for option in ("impacts", "pruning"):
+        if getattr(params, option) and params.scoring_function is None:
+            parser.error("--{} requires one of the similarity functions, not {}".format(option,
+                                                                                       params.similarity_function))
+    if params.impacts and params.pruning:
+        parser.error("--pruning cannot be combined with --impacts")
+    if params.budget is not None and not params.impacts:
+        parser.error("--budget requires --impacts")
+    return params
+
+
+def batch(searcher, topics, params):
+    os.makedirs(params.output_dir, exist_ok=True)
+    run_files = [open(os.path.join(params.output_dir, "{}.trec".format(run.name)), "w") for run in params.runs]
+    topic_results = map_topics(searcher, topics, lambda s, terms: s.search_runs(terms, params.runs, params.show),
+                               params.jobs)
+    for topic_num, run_results in topic_results:
+        for run, run_file, results in zip(params.runs, run_files, run_results):
+            for line in trec_lines(topic_num, results, run.name):
+                run_file.write(line + "\n")
+
+    for run_file in run_files:
+        run_file.close()
+
+
+def print_sweep(maps, k1s, bs):
+    print("MAP of BM25 for k1 (rows) and b (columns)")
+    print("{:>8}".format("k1 \\ b") + "".join("{:>10}".format(b) for b in bs))
+    for k1 in k1s:
+        print("{:>8}".format(k1) + "".join("{:>10.4f}".format(maps[(k1, b)]) for b in bs))
+
+    best_k1, best_b = max(maps, key=maps.get)
+    print()
+    print("Best: k1={} b={} MAP={:.4f}".format(best_k1, best_b, maps[(best_k1, best_b)]))
+
+
+def print_output(topic_id, sorted_scores, run_name):
+    for line in trec_lines(topic_id, sorted_scores, run_name):
+        print(line)
 
 
 def main():
     params = parse_args()
-    scoring_function = params.scoring_function
-    max_docs_per_topic = params.show
-    run_name = params.run_name
+    if params.profile:
+        profile.enable()
+
+    with profile.time("total"):
+        search(params)
+
+    if params.profile:
+        profile.write()
 
-    # load settings and parameters from index directory and validate
+
+def search(params):
     if params.debug:
         print("Loading index")
-    settings_file_path = SETTINGS_FILEPATH
-    if not os.path.isfile(settings_file_path):
-        error_msg = "ERROR: Indexing settings file {} not found. Make sure that " \
-                    "indexing has finished successfully before you start a search.".format(settings_file_path)
+    try:
+        with profile.time("load_index"):
+            # a pool of shard workers cannot be used from topic workers
+            shard_workers = 1 if params.jobs > 1 else params.shard_workers
+            searcher = Searcher(params.postings_cache, params.result_cache, shard_workers)
+    except FileNotFoundError as e:
         if params.debug:
-            raise FileNotFoundError(error_msg)
-        else:
-            print(error_msg, file=sys.stderr)
-            exit(1)
-    with open(settings_file_path, "rb") as settings_file:
-        index_params = pickle.load(settings_file)
-    topics = parse_topics(params.topics_file, index_params.case_folding,
-                          index_params.stop_words, index_params.stemming,
-                          index_params.lemmatization)
+            raise
+        print(e, file=sys.stderr)
+        exit(1)
+
+    if params.mode == "phrase" and not searcher.positions:
+        print("ERROR: Phrase queries need an index created with --positions", file=sys.stderr)
+        exit(1)
+
+    if params.similarity_function == "serve":
+        serve(searcher, params.host, params.port, params.debug)
+        searcher.close()
+        return
+
+    with profile.time("parse_topics"):
+        topics = searcher.parse_topics(params.topics_file)
     if params.topic is not None:
         try:
             topics = {params.topic: topics[params.topic]}
         except KeyError:
             print("ERROR: Requested topic {} does not exist in given topic file".format(params.topic), file=sys.stderr)
             exit(1)
+    profile.count("topics", len(topics))
 
-    # load collection statistics
-    with open(STATISTICS_FILEPATH, "rb") as stat_file:
-        collection_statistics = pickle.load(stat_file)
-        collection_statistics.finalize()    # precompute values
-
-    # load document statistics
-    with open(DOCUMENT_STATISTICS_FILEPATH, "rb") as norm_file:
-        doc_stats = marshal.load(norm_file)
-
-    # load document statistics
-    with open(DOCID_DOCNO_MAPPING, "rb") as mapping_file:
-        docid_docno_mapping = marshal.load(mapping_file)
-
-    # set of all terms which are contained in any query we need
-    all_search_terms = set(itertools.chain.from_iterable(topics.values()))
-
-    # load indexes and keep only the relevant parts in memory
-    if index_params.indexing_method == "map_reduce":
-        index = {}
-        for seg_key in segment_keys:
-            with SegmentFile(seg_key) as segment_file:
-                segment = pickle.load(segment_file)
-                segment = segment if segment is not None else {}
-                filtered_segment = {term: postings for term, postings in segment.items() if term in all_search_terms}
-                index.update(filtered_segment)
-
-    elif index_params.indexing_method == "simple":
-        with open(SIMPLE_INDEX_PATH, "rb") as index_file:
-            index = marshal.load(index_file)
-
-    elif index_params.indexing_method == "spimi":
-        index = {}
-        with open(SPIMI_INDEX_PATH, "r") as index_file:
-            with open(SPIMI_INDEX_INDEX_PATH, "rb") as meta_index_file:
-                meta_index = marshal.load(meta_index_file)
-
-                def find_term_postings(term):
-                    line = index_file.readline()
-                    if not line[:len(term)] == term:
-                        raise RuntimeError("Meta-Index for '{}' points to wrong term '{}'".format(term, line[:len(term)]))
-                    return from_block_line(line)[1]
-
-                # iterate over sorted query terms to get the ideal disk access pattern
-                for term in sorted(all_search_terms):
-                    file_blockpos = meta_index[term]
-                    index_file.seek(file_blockpos)
-                    postings = find_term_postings(term)
-                    if postings is not None:
-                        index[term] = postings
-
-    else:
-        raise ValueError("Encountered unsupported index type {}".format(index_params.indexing_method))
-
-    # final score per document is sum of scores s_t,f occurring in query and document
     if params.debug:
         print("Starting to score documents")
+    if params.similarity_function == "sweep":
+        with profile.time("sweep"):
+            maps = sweep(searcher, topics, Qrels.load(params.qrels), params.k1, params.b, params.show, params.workers)
+        print_sweep(maps, params.k1, params.b)
+        searcher.close()
+        return
+
+    if params.similarity_function == "batch":
+        batch(searcher, topics, params)
+        searcher.close()
+        return
+
     b = getattr(params, "b", None)
     k1 = getattr(params, "k1", None)
-    for topic_num, terms in topics.items():
-        scores = defaultdict(float)
-        for search_term in terms:
-            # ignore term if it is not contained in any document
-            if search_term in index:
-                postings = index[search_term]
-                df_t = len(postings)
-                idf_t = log(collection_statistics.num_documents / df_t)
-                for docid, tf in postings:
-                    doc_length, doc_avgtf = doc_stats[docid]
-                    doc_score = scoring_function(tf_td=tf, idf_t=idf_t, dl=doc_length, avgtf=doc_avgtf,
-                                             collection_statistics=collection_statistics,
-                                             b=b, k1=k1)
-                    scores[docid] += doc_score
-        scores = sorted(scores.items(), key=operator.itemgetter(1), reverse=True)
-
-        # transform docids back to docnos if mapping exists
-        if docid_docno_mapping is not None:
-            scores = map(lambda docid_score: (docid_docno_mapping[docid_score[0]], docid_score[1]), scores)
-
-        print_output(topic_num, scores, run_name, max_docs_per_topic)
+    if params.impacts:
+        parameters = {name: getattr(params, name) for name in score.default_parameters[params.similarity_function]}
+        try:
+            # open the impact index before topic workers are forked
+            searcher.impact_reader(params.similarity_function, parameters)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            exit(1)
+
+        def search_topic(s, terms):
+            return s.search_impacts(terms, params.similarity_function, parameters, params.show, params.budget)
+    else:
+        def search_topic(s, terms):
+            return s.search(terms, params.scoring_function, params.show, b=b, k1=k1, pruning=params.pruning,
+                            mode=params.mode)
+    topic_results = map_topics(searcher, topics, search_topic, params.jobs)
+    for topic_num, results in topic_results:
+        print_output(topic_num, results, params.run_name)
+
+    if params.debug:
+        print(searcher.cache_statistics())
+    searcher.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,52 @@
+import numpy as np
+
+from air18.util.profiling import profile
+
+# query modes: documents containing any query term, all query terms, or all query terms in query order as a phrase
+QUERY_MODES = ["or", "and", "phrase"]
+
+# positions are combined with docids into single keys, documents are shorter than 2 ** POSITION_BITS tokens
+POSITION_BITS = 32
+
+
+def conjunctive_docids(index, terms):
+    """
+    Intersect the postings lists of all terms in ascending order of their document frequencies. Only the shortest
+    list is decoded completely, every further list is only decoded in the blocks which can contain remaining
+    candidates, so the cost grows with the length of the shortest list.
+
+    :return: ascending array of the docids of all documents which contain every term
+    """
+    unique_terms = set(terms)
+    if not unique_terms or any(term not in index for term in unique_terms):
+        return np.zeros(0, dtype=np.int64)
+
+    by_df = sorted(unique_terms, key=index.df)
+    candidates = index.postings(by_df[0])[0]
+    for term in by_df[1:]:
+        if len(candidates) == 0:
+            break
+        profile.count("postings_intersected", len(candidates))
+        candidates = index.select(term, candidates)[0]
+    return candidates
+
+
+def phrase_docids(index, terms):
+    """
+    :return: ascending array of the docids of all documents in which terms occur consecutively in the given order
+    """
+    candidates = conjunctive_docids(index, terms)
+
+    # a phrase starts at position p of a document if term i of the phrase occurs at position p + i, so the start
+    # positions of all terms are intersected as keys (docid, p)
+    keys = None
+    for offset, term in enumerate(terms):
+        if len(candidates) == 0:
+            break
+        docids, tfs, positions = index.select(term, candidates, positions=True)
+        starts = positions - offset
+        valid = starts >= 0
+        term_keys = (np.repeat(docids, tfs)[valid] << POSITION_BITS) | starts[valid]
+        keys = term_keys if keys is None else np.intersect1d(keys, term_keys, assume_unique=True)
+        candidates = np.unique(keys >> POSITION_BITS)
+    return candidates
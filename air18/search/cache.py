@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe cache evicting the least recently used entries once the sizes of all entries exceed the capacity. By
+    default every entry has size 1, so the capacity is a number of entries. A capacity of 0 disables caching.
+    """
+    def __init__(self, capacity, size=lambda value: 1):
+        self.capacity = capacity
+        self.size = size
+        self.entries = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        :param compute: function computing the value of key on a cache miss
+        :return: the cached or computed value of key
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        # computed outside of the lock, so that other threads are not blocked meanwhile
+        value = compute()
+        size = self.size(value)
+        if size > self.capacity:
+            return value
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, size)
+                self.used += size
+                while self.used > self.capacity:
+                    _, (_, evicted_size) = self.entries.popitem(last=False)
+                    self.used -= evicted_size
+        return value
+
+    def __str__(self):
+        with self.lock:
+            return "{} hits, {} misses, {} entries, {} of {} used".format(self.hits, self.misses, len(self.entries),
+                                                                         self.used, self.capacity)
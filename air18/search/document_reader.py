@@ -0,0 +1,32 @@
+import numpy as np
+
+from air18.util.paths import DOCUMENT_LENGTHS_PATH, DOCUMENT_AVGTFS_PATH, DOCNOS_PATH, DOCNO_OFFSETS_PATH
+
+
+class DocumentReader:
+    """
+    Read access to the document statistics and docnos saved by air18.index.documents.DocumentStore. All arrays are
+    memory-mapped, docnos are only decoded when they are requested.
+    """
+    def __init__(self):
+        self.lengths = np.load(DOCUMENT_LENGTHS_PATH, mmap_mode="r")
+        self.avgtfs = np.load(DOCUMENT_AVGTFS_PATH, mmap_mode="r")
+        self.docno_blob = np.load(DOCNOS_PATH, mmap_mode="r")
+        self.docno_offsets = np.load(DOCNO_OFFSETS_PATH, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def docnos(self, docids):
+        """
+        :return: list of the docnos of an array of docids
+        """
+        starts, ends = self.docno_offsets[docids], self.docno_offsets[docids + 1]
+        return [self.docno_blob[start:end].tobytes().decode("utf-8")
+                for start, end in zip(starts.tolist(), ends.tolist())]
+
+    def docno_docid_mapping(self):
+        """
+        :return: dictionary translating every docno to its docid
+        """
+        return {docno: docid for docid, docno in enumerate(self.docnos(np.arange(len(self))))}
@@ -0,0 +1,48 @@
+import numpy as np
+
+from air18.search.ranking import top_k
+from air18.util.profiling import profile
+
+
+def score_at_a_time(reader, terms, num_documents, k, budget=None):
+    """
+    Score-at-a-time retrieval over an impact index. The segments of all query terms are processed in descending order
+    of their scores, so the postings which contribute most to the scores are added first. Processing stops once budget
+    postings have been added, which bounds the work per query independently of the lengths of the postings lists.
+    Without a budget, all postings are added and the ranking equals exhaustive evaluation of the quantized scores.
+
+    :param reader: air18.index.readers.ImpactIndexReader
+    :param budget: maximum number of postings to process, None for no limit
+    :return: Tuple (ranking, scores), ranking is an array of up to k docids, scores the scores of the ranked documents
+    """
+    segments = [reader.segments(term) + (position,) for position, term in enumerate(terms) if term in reader]
+    scores = np.concatenate([np.zeros(0)] + [term_scores for term_scores, _, _, _ in segments])
+    counts = np.concatenate([np.zeros(0, dtype=np.int64)] + [term_counts for _, term_counts, _, _ in segments])
+    positions = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                               [np.full(len(term_counts), position) for _, term_counts, _, position in segments])
+    docids = np.concatenate([np.zeros(0, dtype=np.int64)] + [term_docids for _, _, term_docids, _ in segments])
+    starts = np.cumsum(counts) - counts
+
+    # among segments of the same score, query term order keeps the evaluation and its floating point sums
+    # deterministic
+    order = np.lexsort((positions, -scores))
+    # with a budget, segments after the one in which the budget runs out are not needed
+    if budget is not None:
+        budget = max(budget, 0)
+        order = order[:int(np.searchsorted(np.cumsum(counts[order]), budget)) + 1]
+
+    # the postings of all processed segments in processing order are added in one pass, which sums up the scores of
+    # every document in segment order like adding the segments one by one would
+    ordered_counts = counts[order]
+    ordered_starts = np.cumsum(ordered_counts) - ordered_counts
+    postings = np.arange(int(ordered_counts.sum())) + np.repeat(starts[order] - ordered_starts, ordered_counts)
+    if budget is not None:
+        postings = postings[:budget]
+    profile.count("postings_scored", len(postings))
+    accumulators = np.bincount(docids[postings], weights=np.repeat(scores[order], ordered_counts)[:len(postings)],
+                               minlength=num_documents)
+    matched = np.zeros(num_documents, dtype=bool)
+    matched[docids[postings]] = True
+
+    ranking = top_k(accumulators, matched, k)
+    return ranking, accumulators[ranking]
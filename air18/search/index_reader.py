@@ -0,0 +1,48 @@
+from air18.search.cache import LRUCache
+from air18.util.profiling import profile
+
+
+def postings_size(postings):
+    return 0 if postings is None else postings[0].nbytes + postings[1].nbytes
+
+
+class CachedIndexReader:
+    """
+    Keeps the decoded postings lists of recently used terms in memory, up to a budget in bytes.
+    """
+    def __init__(self, index, capacity):
+        self.index = index
+        self.cache = LRUCache(capacity, size=postings_size)
+
+    def __contains__(self, term):
+        return term in self.index
+
+    def df(self, term):
+        return self.index.df(term)
+
+    def load_postings(self, term):
+        postings = self.index.postings(term)
+        if postings is not None:
+            profile.count("postings_decoded", len(postings[0]))
+            # decoded arrays may be views which keep a larger decoding buffer alive, e.g. tfs of the interleaved
+            # values, so views are copied for postings_size to account for all memory the cache holds
+            postings = tuple(array if array.base is None else array.copy() for array in postings)
+            # cached arrays are shared by all queries
+            for array in postings:
+                array.flags.writeable = False
+        return postings
+
+    def postings(self, term):
+        return self.cache.get(term, lambda: self.load_postings(term))
+
+    def select(self, term, docids, positions=False):
+        return self.index.select(term, docids, positions)
+
+    def prefix(self, prefix):
+        return self.index.prefix(prefix)
+
+    def score_bound_data(self, term):
+        return self.index.score_bound_data(term)
+
+    def close(self):
+        self.index.close()
@@ -0,0 +1,49 @@
+import multiprocessing
+
+from air18.util.profiling import profile
+
+# state of a topic worker process, set by init_job_worker
+_job_state = None
+
+
+def init_job_worker(searcher, search_topic):
+    global _job_state
+    _job_state = (searcher, search_topic)
+    # measurements of the parent before forking are reported by the parent
+    profile.reset()
+
+
+def run_job(topic):
+    searcher, search_topic = _job_state
+    topic_num, terms = topic
+    with profile.latency("topic"):
+        result = search_topic(searcher, terms)
+    return topic_num, result, profile.collect()
+
+
+def map_topics(searcher, topics, search_topic, jobs=1):
+    """
+    Search all topics, spread over jobs worker processes. The workers are forked from this process, so they share the
+    loaded index, document statistics and caches read-only instead of loading or copying them. Every worker searches
+    slices of consecutive topics and results are passed back as soon as they are available, together with the profile
+    measurements of every topic.
+
+    :param topics: dictionary topic number -> query terms
+    :param search_topic: function (searcher, terms) -> result, must not depend on state changed after forking
+    :return: iterator over Tuples (topic number, result) in the order of topics, independent of jobs
+    """
+    if jobs <= 1 or len(topics) <= 1:
+        for topic_num, terms in topics.items():
+            with profile.latency("topic"):
+                result = search_topic(searcher, terms)
+            yield topic_num, result
+        return
+
+    # several slices per worker, so that a slice of expensive topics does not keep the other workers waiting
+    chunksize = max(1, len(topics) // (4 * jobs))
+    # fork explicitly, the searcher with its memory-mapped files cannot be pickled to spawned processes
+    context = multiprocessing.get_context("fork")
+    with context.Pool(jobs, initializer=init_job_worker, initargs=(searcher, search_topic)) as pool:
+        for topic_num, result, profile_data in pool.imap(run_job, topics.items(), chunksize=chunksize):
+            profile.merge(profile_data)
+            yield topic_num, result
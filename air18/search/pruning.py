@@ -0,0 +1,108 @@
+from math import log
+
+import numpy as np
+
+from air18.search.ranking import top_k
+from air18.util.profiling import profile
+
+# relative slack on score upper bounds, so that rounding errors never prune a document which could tie the k-th best
+BOUND_SLACK = 1e-9
+
+
+def supports_pruning(b=None, k1=None):
+    """
+    Score upper bounds assume that scores are non-negative, grow with tf and shrink with dl. This holds for all
+    similarity functions as long as b lies in [0, 1] and k1 is non-negative.
+    """
+    return (b is None or 0 <= b <= 1) and (k1 is None or k1 >= 0)
+
+
+def term_score_bound(bound_data, term_scores):
+    """
+    :param bound_data: score upper bound data of a term, see air18.index.bounds.score_bound_data
+    :param term_scores: function (tfs, dls, avgtfs) -> scores of the term
+    :return: the maximum score any document can get for the term
+    """
+    min_avgtf, tfs, dls = bound_data
+    return float(np.max(term_scores(np.array(tfs), np.array(dls), min_avgtf)))
+
+
+def kth_best_score(scores, candidates, k):
+    candidate_scores = scores[candidates]
+    if len(candidate_scores) < k:
+        return -np.inf
+    return np.partition(candidate_scores, len(candidate_scores) - k)[len(candidate_scores) - k]
+
+
+def max_score(searcher, terms, scoring_function, k, b=None, k1=None):
+    """
+    Top-k retrieval with MaxScore dynamic pruning, returning exactly the documents and scores of exhaustive
+    evaluation.
+
+    Terms are processed in descending order of their score upper bounds. As soon as the bounds of the remaining terms
+    add up to less than the current k-th best score, documents which have not been seen yet cannot enter the top k
+    anymore. The remaining, non-essential terms then only update the documents which can still reach the k-th best
+    score, and candidates are dropped as the remaining bound shrinks. Finally the scores of the surviving candidates
+    are recomputed in query term order, so that floating point sums equal those of exhaustive evaluation.
+
+    Bounds only need the bound data and df of a term. Only the postings lists of essential terms are decoded
+    completely, for the other terms only the blocks which contain candidates are decoded, see
+    air18.index.postings.EncodedPostings.
+
+    :return: Tuple (ranking, scores), ranking is an array of up to k docids, scores a dense array indexed by docid
+    """
+    statistics = searcher.collection_statistics
+    num_documents = statistics.num_documents
+
+    def term_scores(tfs, dls, avgtfs, idf_t):
+        return scoring_function(tf_td=tfs, idf_t=idf_t, dl=dls, avgtf=avgtfs, collection_statistics=statistics,
+                                b=b, k1=k1)
+
+    def score_postings(scores, docids, tfs, idf_t):
+        profile.count("postings_scored", len(docids))
+        scores[docids] += term_scores(tfs, searcher.doc_lengths[docids], searcher.doc_avgtfs[docids], idf_t)
+
+    # score upper bounds of all query terms, ignoring terms which are not contained in any document
+    lists = []
+    for term in terms:
+        if term in searcher.index:
+            idf_t = log(num_documents / searcher.index.df(term))
+            bound = term_score_bound(searcher.index.score_bound_data(term),
+                                     lambda tfs, dls, avgtfs: term_scores(tfs, dls, avgtfs, idf_t))
+            lists.append((term, idf_t, bound))
+
+    by_bound = sorted(lists, key=lambda term_list: term_list[2], reverse=True)
+    remaining_bounds = np.cumsum([bound for *_, bound in reversed(by_bound)])[::-1] * (1 + BOUND_SLACK)
+
+    scores = np.zeros(num_documents)
+    candidates = np.zeros(num_documents, dtype=bool)
+
+    # essential terms: every document in their postings is a candidate
+    postings = {}
+    num_essential = 0
+    while num_essential < len(by_bound):
+        if remaining_bounds[num_essential] < kth_best_score(scores, candidates, k):
+            break
+        term, idf_t, _ = by_bound[num_essential]
+        docids, tfs = postings[term] = searcher.index.postings(term)
+        score_postings(scores, docids, tfs, idf_t)
+        candidates[docids] = True
+        num_essential += 1
+
+    # non-essential terms: only update candidates which can still reach the k-th best score
+    for position in range(num_essential, len(by_bound)):
+        candidates &= scores * (1 + BOUND_SLACK) + remaining_bounds[position] >= kth_best_score(scores, candidates, k)
+        term, idf_t, _ = by_bound[position]
+        score_postings(scores, *searcher.index.select(term, np.flatnonzero(candidates)), idf_t)
+
+    final_candidates = np.flatnonzero(candidates)
+    final_scores = np.zeros(num_documents)
+    for term, idf_t, _ in lists:
+        if term in postings:
+            docids, tfs = postings[term]
+            mask = candidates[docids]
+            score_postings(final_scores, docids[mask], tfs[mask], idf_t)
+        else:
+            score_postings(final_scores, *searcher.index.select(term, final_candidates), idf_t)
+
+    return top_k(final_scores, candidates, k), final_scores
@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def top_k(scores, matched, k):
+    """
+    Select the k best documents without sorting all matched documents.
+
+    :param scores: dense array of scores indexed by docid
+    :param matched: dense boolean array of documents which contain at least one query term
+    :param k: maximum number of documents to return
+    :return: array of docids ordered by descending score, ties by ascending docid
+    """
+    candidates = np.flatnonzero(matched)
+    if k <= 0:
+        return candidates[:0]
+
+    if k < len(candidates):
+        # keep every candidate which is at least as good as the k-th best one, so that ties at the boundary are
+        # resolved by docid exactly like a full sort would do
+        candidate_scores = scores[candidates]
+        kth_score = -np.partition(-candidate_scores, k - 1)[k - 1]
+        candidates = candidates[candidate_scores >= kth_score]
+
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:k]
@@ -0,0 +1,274 @@
+import os
+import pickle
+from math import log
+
+import numpy as np
+
+from air18.index.tokens import get_tokenizer
+from air18.search.document_reader import DocumentReader
+from air18.search.cache import LRUCache
+from air18.index.impacts import load_impacts
+from air18.index.shards import load_shards
+from air18.index.readers import open_index, ImpactIndexReader
+from air18.search.boolean import conjunctive_docids, phrase_docids
+from air18.search.impacts import score_at_a_time
+from air18.search.index_reader import CachedIndexReader
+from air18.search.pruning import supports_pruning, max_score
+from air18.search.ranking import top_k
+from air18.search.shards import ShardPool
+from air18.index.score import similarity_functions
+from air18.util.parsing import parse_topics
+from air18.util.paths import SETTINGS_FILEPATH, STATISTICS_FILEPATH
+from air18.util.profiling import profile
+
+# default budget of the postings cache in MB and capacity of the result cache in queries
+POSTINGS_CACHE_SIZE = 256
+RESULT_CACHE_SIZE = 10000
+
+
+def trec_lines(topic_id, sorted_scores, run_name):
+    for rank, (docid, score) in enumerate(sorted_scores):
+        yield "{topic_id} Q0 {document_id} {rank} {score} {run_name}".format(
+            topic_id=topic_id, document_id=docid, rank=rank, score=score,
+            run_name=run_name
+        )
+
+
+class Searcher:
+    """
+    Loads settings, statistics and the index from the index directory once and answers queries against them.
+    Decoded postings lists of recently used terms and the results of recent queries are cached. Queries against a
+    sharded index are scored in all shards in parallel if shard workers are requested.
+    """
+    def __init__(self, postings_cache_size=POSTINGS_CACHE_SIZE, result_cache_size=RESULT_CACHE_SIZE, shard_workers=None):
+        """
+        :param postings_cache_size: memory budget of the postings cache in MB, 0 disables it
+        :param result_cache_size: number of cached query results, 0 disables the cache
+        :param shard_workers: number of processes searching the shards of a sharded index, by default one per shard up
+                              to the number of CPUs. With 1 the shards are searched in this process.
+        """
+        # load settings and parameters from index directory and validate
+        if not os.path.isfile(SETTINGS_FILEPATH):
+            raise FileNotFoundError("ERROR: Indexing settings file {} not found. Make sure that indexing has "
+                                    "finished successfully before you start a search.".format(SETTINGS_FILEPATH))
+        with open(SETTINGS_FILEPATH, "rb") as settings_file:
+            self.index_params = pickle.load(settings_file)
+        self.tokenizer = get_tokenizer(self.index_params)
+        # indexes created before positions were supported have no such setting
+        self.positions = getattr(self.index_params, "positions", False)
+
+        # load collection statistics
+        with open(STATISTICS_FILEPATH, "rb") as stat_file:
+            self.collection_statistics = pickle.load(stat_file)
+            self.collection_statistics.finalize()    # precompute values
+
+        # map document statistics and docnos, dense arrays indexed by docid
+        self.documents = DocumentReader()
+        self.doc_lengths, self.doc_avgtfs = self.documents.lengths, self.documents.avgtfs
+
+        # open the index, postings are only read when they are needed for scoring
+        self.index = CachedIndexReader(open_index(self.index_params), postings_cache_size * 1024 * 1024)
+        self.result_cache = LRUCache(result_cache_size)
+
+        shards = load_shards()
+        if shard_workers is None:
+            shard_workers = min(len(shards), os.cpu_count() or 1)
+        self.shard_pool = ShardPool(shards, self.collection_statistics, shard_workers) \
+            if len(shards) > 1 and shard_workers > 1 else None
+
+        # precomputed impact indexes, opened on first use
+        self.impact_indexes = load_impacts()
+        self.impact_readers = {}
+
+    def parse_topics(self, topics_file):
+        """
+        Parse a topic file, processing the query tokens in the same way as the indexed documents.
+        """
+        return parse_topics(topics_file, self.tokenizer)
+
+    def tokenize(self, query):
+        """
+        Process a free text query in the same way as the indexed documents.
+        """
+        return self.tokenizer(query)
+
+    def score(self, terms, scoring_function, b=None, k1=None):
+        """
+        The final score per document is the sum of scores s_t,f of all terms occurring in query and document.
+
+        :return: Tuple (scores, matched) of dense arrays indexed by docid, matched marks all documents which contain
+                 at least one of the terms
+        """
+        num_documents = self.collection_statistics.num_documents
+        scores = np.zeros(num_documents)
+        matched = np.zeros(num_documents, dtype=bool)
+        for term in terms:
+            # ignore term if it is not contained in any document
+            if term in self.index:
+                docids, tfs = self.index.postings(term)
+                idf_t = log(num_documents / len(docids))
+                profile.count("postings_scored", len(docids))
+
+                # score the whole postings list at once, docids are unique within a postings list
+                scores[docids] += scoring_function(tf_td=tfs, idf_t=idf_t, dl=self.doc_lengths[docids],
+                                                   avgtf=self.doc_avgtfs[docids],
+                                                   collection_statistics=self.collection_statistics,
+                                                   b=b, k1=k1)
+                matched[docids] = True
+
+        return scores, matched
+
+    def score_runs(self, terms, runs):
+        """
+        Score documents for several runs at once, reading and preparing the postings of every term only once.
+
+        :param runs: list of air18.index.score.Run
+        :return: Tuple (list of score arrays, one per run, matched)
+        """
+        num_documents = self.collection_statistics.num_documents
+        run_scores = [np.zeros(num_documents) for _ in runs]
+        matched = np.zeros(num_documents, dtype=bool)
+        for term in terms:
+            if term in self.index:
+                docids, tfs = self.index.postings(term)
+                idf_t = log(num_documents / len(docids))
+                profile.count("postings_scored", len(docids) * len(runs))
+                dls, avgtfs = self.doc_lengths[docids], self.doc_avgtfs[docids]
+                for run, scores in zip(runs, run_scores):
+                    scores[docids] += similarity_functions[run.similarity](
+                        tf_td=tfs, idf_t=idf_t, dl=dls, avgtf=avgtfs, collection_statistics=self.collection_statistics,
+                        **run.parameters)
+                matched[docids] = True
+
+        return run_scores, matched
+
+    def search_runs(self, terms, runs, max_docs):
+        """
+        :return: list of search results, one per run, see search
+        """
+        run_scores, matched = self.score_runs(terms, runs)
+        results = []
+        for scores in run_scores:
+            ranking = top_k(scores, matched, max_docs)
+            results.append(self.results(ranking, scores[ranking]))
+        return results
+
+    def results(self, ranking, ranking_scores):
+        return list(zip(self.documents.docnos(ranking), ranking_scores.tolist()))
+
+    def search_shards(self, terms, scoring_function, max_docs, b=None, k1=None):
+        """
+        Score terms in all shards in parallel, the idf of every term is taken from the whole collection.
+
+        :return: Tuple (ranking, scores of the ranked documents)
+        """
+        num_documents = self.collection_statistics.num_documents
+        term_idfs = [(term, log(num_documents / self.index.df(term))) for term in terms if term in self.index]
+        return self.shard_pool.search(term_idfs, scoring_function, max_docs, b=b, k1=k1)
+
+    def boolean_docids(self, terms, mode, required):
+        """
+        :return: ascending array of the docids of all documents matching terms in mode which contain all required terms
+        """
+        if mode == "phrase":
+            if not self.positions:
+                raise ValueError("ERROR: Phrase queries need an index created with --positions")
+            docids = phrase_docids(self.index, terms)
+            return np.intersect1d(docids, conjunctive_docids(self.index, required)) if required else docids
+        elif mode == "and":
+            return conjunctive_docids(self.index, list(terms) + list(required))
+        return conjunctive_docids(self.index, required)
+
+    def score_docids(self, terms, docids, scoring_function, b=None, k1=None):
+        """
+        Score the given documents only, reading just the blocks of the postings lists which contain them. Scores are
+        summed in query term order like in score, so they are the same.
+
+        :param docids: ascending array of docids
+        :return: array of the scores of docids
+        """
+        num_documents = self.collection_statistics.num_documents
+        scores = np.zeros(len(docids))
+        for term in terms:
+            if term in self.index:
+                term_docids, tfs = self.index.select(term, docids)
+                idf_t = log(num_documents / self.index.df(term))
+                profile.count("postings_scored", len(term_docids))
+                scores[np.searchsorted(docids, term_docids)] += scoring_function(
+                    tf_td=tfs, idf_t=idf_t, dl=self.doc_lengths[term_docids], avgtf=self.doc_avgtfs[term_docids],
+                    collection_statistics=self.collection_statistics, b=b, k1=k1)
+        return scores
+
+    def search(self, terms, scoring_function, max_docs, b=None, k1=None, pruning=False, mode="or", required=()):
+        """
+        :param pruning: skip documents which cannot enter the top max_docs with MaxScore dynamic pruning, this does
+                        not change the results. Not used when searching shards in parallel or in the and and phrase
+                        modes.
+        :param mode: one of air18.search.boolean.QUERY_MODES. With "and", only documents containing all terms are
+                     returned, with "phrase" only documents in which the terms occur consecutively in query order.
+        :param required: terms which every returned document must contain, whether they are scored or not depends on
+                         whether they are contained in terms
+        :return: list of up to max_docs tuples (docno, score) ordered by descending score
+        """
+        def compute():
+            if mode != "or" or required:
+                docids = self.boolean_docids(terms, mode, required)
+                scores = self.score_docids(terms, docids, scoring_function, b=b, k1=k1)
+                ranking = top_k(scores, np.ones(len(docids), dtype=bool), max_docs)
+                return tuple(self.results(docids[ranking], scores[ranking]))
+            if self.shard_pool is not None:
+                ranking, ranking_scores = self.search_shards(terms, scoring_function, max_docs, b=b, k1=k1)
+                return tuple(self.results(ranking, ranking_scores))
+            if pruning and supports_pruning(b=b, k1=k1):
+                ranking, scores = max_score(self, terms, scoring_function, max_docs, b=b, k1=k1)
+            else:
+                scores, matched = self.score(terms, scoring_function, b=b, k1=k1)
+                ranking = top_k(scores, matched, max_docs)
+            return tuple(self.results(ranking, scores[ranking]))
+
+        # scores are summed in query term order, so the order of the terms is part of the key. Pruning does not change
+        # the results and is not.
+        key = (tuple(terms), scoring_function, max_docs, b, k1, mode, tuple(required))
+        return list(self.result_cache.get(key, compute))
+
+    def impact_reader(self, similarity, parameters):
+        """
+        :param similarity: name of the similarity function, see air18.index.score.similarity_functions
+        :param parameters: dictionary of the parameters of the similarity function
+        :return: ImpactIndexReader of the impact index precomputed for similarity and parameters
+        """
+        for name, impact_index in self.impact_indexes.items():
+            if impact_index.run.similarity == similarity and impact_index.run.parameters == parameters:
+                if name not in self.impact_readers:
+                    self.impact_readers[name] = ImpactIndexReader(impact_index)
+                return self.impact_readers[name]
+        raise ValueError("ERROR: No impact index of {} with parameters {} found. Build it with the --impacts option of "
+                         "air18.index".format(similarity, parameters))
+
+    def search_impacts(self, terms, similarity, parameters, max_docs, budget=None):
+        """
+        Score-at-a-time search over a precomputed impact index, see air18.search.impacts. Scores are sums of quantized
+        impacts and approximate those of search.
+
+        :param budget: maximum number of postings processed for the query, None for no limit
+        :return: list of up to max_docs tuples (docno, score) ordered by descending score
+        """
+        reader = self.impact_reader(similarity, parameters)
+
+        def compute():
+            ranking, ranking_scores = score_at_a_time(reader, terms, self.collection_statistics.num_documents,
+                                                      max_docs, budget)
+            return tuple(self.results(ranking, ranking_scores))
+
+        key = (tuple(terms), "impacts", similarity, tuple(sorted(parameters.items())), max_docs, budget)
+        return list(self.result_cache.get(key, compute))
+
+    def cache_statistics(self):
+        return "postings cache: {}\nresult cache: {}".format(self.index.cache, self.result_cache)
+
+    def close(self):
+        if self.shard_pool is not None:
+            self.shard_pool.close()
+        for reader in self.impact_readers.values():
+            reader.close()
+        self.index.close()
@@ -0,0 +1,147 @@
+import json
+from itertools import islice
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from air18.index import score
+from air18.search.boolean import QUERY_MODES
+from air18.search.searcher import trec_lines
+
+
+class QueryError(ValueError):
+    pass
+
+
+def query_params(query_string):
+    """
+    Parse and validate the parameters of a search request.
+
+    :return: dictionary of query, similarity, scoring function parameters b and k1, show, pruning, mode, required
+             words, format, topic and run name
+    """
+    raw = {key: values[-1] for key, values in parse_qs(query_string).items()}
+    if "q" not in raw:
+        raise QueryError("Parameter q is required")
+
+    similarity = raw.get("similarity", "bm25")
+    if similarity not in score.similarity_functions:
+        raise QueryError("Unknown similarity function {}, choose one of {}".format(
+            similarity, ", ".join(sorted(score.similarity_functions))))
+
+    params = {"query": raw["q"], "similarity": similarity, "b": None, "k1": None,
+              "format": raw.get("format", "json"), "topic": raw.get("topic", "0"),
+              "run_name": raw.get("run_name", "DefaultRun"), "pruning": raw.get("pruning", "0") == "1",
+              "mode": raw.get("mode", "or"), "required": raw.get("required", "")}
+    try:
+        for name, default in score.default_parameters[similarity].items():
+            params[name] = float(raw.get(name, default))
+        params["show"] = int(raw.get("show", 1000))
+    except ValueError as e:
+        raise QueryError(str(e))
+
+    if params["mode"] not in QUERY_MODES:
+        raise QueryError("Unknown mode {}, choose one of {}".format(params["mode"], ", ".join(QUERY_MODES)))
+    if params["format"] not in ("json", "trec"):
+        raise QueryError("Unknown format {}, choose one of json, trec".format(params["format"]))
+
+    return params
+
+
+def prefix_params(query_string):
+    """
+    Parse and validate the parameters of a term prefix request.
+
+    :return: Tuple (prefix, limit)
+    """
+    raw = {key: values[-1] for key, values in parse_qs(query_string).items()}
+    if "prefix" not in raw:
+        raise QueryError("Parameter prefix is required")
+    try:
+        return raw["prefix"], int(raw.get("limit", 100))
+    except ValueError as e:
+        raise QueryError(str(e))
+
+
+def make_handler(searcher, debug):
+    class QueryHandler(BaseHTTPRequestHandler):
+        """
+        Answers GET /search?q=<query>[&similarity=bm25][&k1=..][&b=..][&show=1000][&pruning=1][&mode=or|and|phrase]
+        [&required=<words>][&format=json|trec] and GET /terms?prefix=<prefix>[&limit=100]. Results must contain all
+        required words, which are only scored if they are part of the query as well.
+        """
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/terms":
+                self.terms(url.query)
+                return
+            if url.path != "/search":
+                self.respond(404, {"error": "Unknown path {}, use /search or /terms".format(url.path)})
+                return
+
+            try:
+                params = query_params(url.query)
+            except QueryError as e:
+                self.respond(400, {"error": str(e)})
+                return
+
+            terms = searcher.tokenize(params["query"])
+            try:
+                results = searcher.search(terms, score.similarity_functions[params["similarity"]], params["show"],
+                                          b=params["b"], k1=params["k1"], pruning=params["pruning"],
+                                          mode=params["mode"], required=searcher.tokenize(params["required"]))
+            except ValueError as e:
+                self.respond(400, {"error": str(e)})
+                return
+
+            if params["format"] == "trec":
+                self.respond(200, "".join(line + "\n" for line in trec_lines(params["topic"], results,
+                                                                               params["run_name"])))
+            else:
+                self.respond(200, {"query": params["query"], "terms": terms,
+                                   "results": [{"rank": rank, "docno": docno, "score": doc_score}
+                                               for rank, (docno, doc_score) in enumerate(results)]})
+            if debug:
+                self.log_message("%s", searcher.cache_statistics().replace("\n", ", "))
+
+        def terms(self, query_string):
+            try:
+                prefix, limit = prefix_params(query_string)
+            except QueryError as e:
+                self.respond(400, {"error": str(e)})
+                return
+
+            # the prefix is matched against indexed terms, so it is not tokenized
+            self.respond(200, {"prefix": prefix, "terms": [{"term": term, "df": df} for term, df in
+                                                           islice(searcher.index.prefix(prefix), limit)]})
+
+        def respond(self, status, body):
+            if isinstance(body, str):
+                content_type, data = "text/plain; charset=utf-8", body.encode("utf-8")
+            else:
+                content_type, data = "application/json", json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            if debug:
+                super().log_message(format, *args)
+
+    return QueryHandler
+
+
+def serve(searcher, host, port, debug=False):
+    """
+    Answer queries over HTTP until interrupted. Every request is handled in its own thread, all threads share the
+    already loaded searcher.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(searcher, debug))
+    print("Serving queries on http://{}:{}/search?q=...".format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,90 @@
+import multiprocessing
+
+import numpy as np
+
+from air18.index.readers import IndexReader
+from air18.index.shards import shard_paths
+from air18.search.document_reader import DocumentReader
+from air18.search.ranking import top_k
+from air18.util.profiling import profile
+
+# state of a shard worker process, set by init_shard_worker
+_shard_state = None
+
+
+def init_shard_worker(ranges, collection_statistics):
+    global _shard_state
+    _shard_state = {"ranges": ranges, "collection_statistics": collection_statistics, "documents": DocumentReader(),
+                    "readers": {}}
+    # measurements of the parent before forking are reported by the parent
+    profile.reset()
+
+
+def shard_reader(shardno):
+    # every worker can be asked to search any shard, shards are opened on first use
+    readers = _shard_state["readers"]
+    if shardno not in readers:
+        readers[shardno] = IndexReader(*shard_paths(shardno))
+    return readers[shardno]
+
+
+def search_shard(task):
+    """
+    Score the documents of one shard and select its best k.
+
+    :param task: Tuple (shard number, list of Tuples (term, idf), scoring function, k, b, k1)
+    :return: Tuple (docids, scores, profile data) of the best k documents of the shard, ordered by descending score,
+             and the profile measurements of the search, see Profile.collect
+    """
+    shardno, term_idfs, scoring_function, k, b, k1 = task
+    first_docid, end_docid = _shard_state["ranges"][shardno]
+    documents = _shard_state["documents"]
+    index = shard_reader(shardno)
+
+    scores = np.zeros(end_docid - first_docid)
+    matched = np.zeros(end_docid - first_docid, dtype=bool)
+    for term, idf_t in term_idfs:
+        if term in index:
+            docids, tfs = index.postings(term)
+            shard_docids = docids - first_docid
+            scores[shard_docids] += scoring_function(tf_td=tfs, idf_t=idf_t, dl=documents.lengths[docids],
+                                                     avgtf=documents.avgtfs[docids],
+                                                     collection_statistics=_shard_state["collection_statistics"],
+                                                     b=b, k1=k1)
+            matched[shard_docids] = True
+            # shard workers do not cache postings, every list is decoded anew
+            profile.count("postings_decoded", len(docids))
+            profile.count("postings_scored", len(docids))
+
+    ranking = top_k(scores, matched, k)
+    return ranking + first_docid, scores[ranking], profile.collect()
+
+
+class ShardPool:
+    """
+    Scatter-gather search over the shards of a sharded index. Every query is scored in all shards in parallel by a pool
+    of worker processes, using idf values of the whole collection, and the best documents of the shards are merged.
+    The results are the same as those of the unsharded index.
+    """
+    def __init__(self, ranges, collection_statistics, workers):
+        self.ranges = ranges
+        self.pool = multiprocessing.Pool(workers, initializer=init_shard_worker,
+                                         initargs=(ranges, collection_statistics))
+
+    def search(self, term_idfs, scoring_function, k, b=None, k1=None):
+        """
+        :param term_idfs: list of Tuples (term, idf) of all query terms contained in the collection, in query order
+        :return: Tuple (docids, scores) of the best k documents, ordered by descending score, ties by ascending docid
+        """
+        tasks = [(shardno, term_idfs, scoring_function, k, b, k1) for shardno in range(len(self.ranges))]
+        shard_results = self.pool.map(search_shard, tasks)
+        for _, _, profile_data in shard_results:
+            profile.merge(profile_data)
+        docids = np.concatenate([docids for docids, _, _ in shard_results])
+        scores = np.concatenate([scores for _, scores, _ in shard_results])
+        order = np.lexsort((docids, -scores))[:k]
+        return docids[order], scores[order]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
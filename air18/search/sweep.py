@@ -0,0 +1,86 @@
+import multiprocessing
+from math import log
+
+import numpy as np
+
+from air18.eval.measures import evaluate_run
+from air18.index.score import bm25
+from air18.search.ranking import top_k
+
+# state shared with the worker processes of a sweep, set by init_worker
+_sweep_state = None
+
+
+def prepare_sweep(searcher, topics, qrels, max_docs):
+    """
+    Read postings and document lengths of all query terms and the docnos of all documents which contain any of them
+    once.
+
+    :param qrels: air18.eval.qrels.Qrels
+    :return: state of a sweep, as needed by evaluate_configuration
+    """
+    num_documents = searcher.collection_statistics.num_documents
+
+    topic_postings = {}
+    topic_docnos = {}
+    for topic_num, terms in topics.items():
+        topic_postings[topic_num] = []
+        for term in terms:
+            if term in searcher.index:
+                docids, tfs = searcher.index.postings(term)
+                topic_postings[topic_num].append((docids, tfs, log(num_documents / len(docids)),
+                                                  searcher.doc_lengths[docids]))
+        # ranked documents are translated to docnos by their position among all matched documents
+        matched_docids = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] +
+                                                  [docids for docids, _, _, _ in topic_postings[topic_num]]))
+        topic_docnos[topic_num] = (matched_docids, np.array(searcher.documents.docnos(matched_docids), dtype=object))
+
+    return {"postings": topic_postings, "docnos": topic_docnos, "qrels": qrels, "num_documents": num_documents,
+            "collection_statistics": searcher.collection_statistics, "max_docs": max_docs}
+
+
+def evaluate_configuration(state, k1, b):
+    """
+    Rank every topic with BM25 like Searcher.search_runs and evaluate the run like air18.eval does, so that the MAP
+    equals that of the run written with the same parameters, ties included.
+
+    :return: MAP of BM25 with the given parameters over all judged topics, topics without results count as 0
+    """
+    run = {}
+    for topic_num, postings in state["postings"].items():
+        scores = np.zeros(state["num_documents"])
+        matched = np.zeros(state["num_documents"], dtype=bool)
+        for docids, tfs, idf_t, dls in postings:
+            scores[docids] += bm25(tf_td=tfs, idf_t=idf_t, collection_statistics=state["collection_statistics"],
+                                   k1=k1, b=b, dl=dls)
+            matched[docids] = True
+
+        ranking = top_k(scores, matched, state["max_docs"])
+        matched_docids, matched_docnos = state["docnos"][topic_num]
+        run[topic_num] = list(zip(matched_docnos[np.searchsorted(matched_docids, ranking)].tolist(),
+                                  scores[ranking].tolist()))
+
+    average_precisions = evaluate_run(state["qrels"], run)["map"]
+    return float(np.mean(average_precisions)) if len(average_precisions) > 0 else 0.0
+
+
+def init_worker(state):
+    global _sweep_state
+    _sweep_state = state
+
+
+def evaluate_worker(k1_b):
+    return evaluate_configuration(_sweep_state, *k1_b)
+
+
+def sweep(searcher, topics, qrels, k1s, bs, max_docs, workers):
+    """
+    Evaluate BM25 for every combination of k1 and b, spreading the configurations over worker processes.
+
+    :return: dictionary (k1, b) -> MAP
+    """
+    state = prepare_sweep(searcher, topics, qrels, max_docs)
+    configurations = [(k1, b) for k1 in k1s for b in bs]
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(state,)) as pool:
+        maps = pool.map(evaluate_worker, configurations)
+    return dict(zip(configurations, maps))
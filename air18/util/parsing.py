@@ -1,16 +1,19 @@
-import functools
+import itertools
 import json
 import re
 from xml.etree import ElementTree as ET
 
-from air18.index.tokens import air_tokenize
-
 NUMBER_REGEX = r"<num> Number: (4\d\d)"
 TITLE_REGEX = r"<title> (.*)"
 
+# number of characters read at once by the incremental parsers
+CHUNK_SIZE = 1 << 16
+
+# characters to skip before and within the JSON document array
+JSON_SEPARATORS = {False: " \t\r\n", True: " \t\r\n,"}
+
 
-def parse_topics(topics_file, case_folding=False, stop_words=False, stemming=False,
-                 lemmatization=False):
+def parse_topics(topics_file, tokenizer):
     topics_string = topics_file.read()
     numbers = re.findall(NUMBER_REGEX, topics_string)
     titles = re.findall(TITLE_REGEX, topics_string)
@@ -18,26 +21,89 @@ def parse_topics(topics_file, case_folding=False, stop_words=False, stemming=Fal
     if len(numbers) != len(titles):
         raise ValueError("Topic file is invalid. Number of <num> and <title> tags must be equal")
 
-    tokenize_fun = functools.partial(air_tokenize, case_folding=case_folding,
-                                     stop_words=stop_words, stemming=stemming,
-                                     lemmatization=lemmatization)
-    title_tokens = map(list, map(tokenize_fun, titles))
+    title_tokens = map(tokenizer, titles)
     return dict(zip(numbers, title_tokens))
 
 
+def read_chunks(file):
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if chunk == "":
+            return
+        yield chunk
+
+
 def parse_xml(file):
-    root = ET.fromstringlist(["<ROOT>", file.read(), "</ROOT>"])
-    for doc in root.findall("DOC"):
-        docno = doc.find("DOCNO").text.strip()
-        text = "\n".join(doc.find("TEXT").itertext())
-        # Documents that do not have a <TEXT> tag can be ignored
-        if text != "":
-            yield docno, text
+    """
+    Incrementally parse a TREC file, every document is yielded as soon as its <DOC> element is closed and then
+    discarded, so that only about one document is held in memory.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    parser.feed("<ROOT>")
+    root = None
+    depth = 0
+    for chunk in itertools.chain(read_chunks(file), ["</ROOT>"]):
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 1 and element.tag == "DOC":
+                docno = element.find("DOCNO").text.strip()
+                text_element = element.find("TEXT")
+                text = "\n".join(text_element.itertext()) if text_element is not None else ""
+                root.clear()
+                # Documents that do not have a <TEXT> tag can be ignored
+                if text != "":
+                    yield docno, text
+    parser.close()
 
 
 def parse_json(file):
-    doclist = json.load(file)
-    for doc in doclist:
+    """
+    Incrementally parse a JSON array of documents, every document is yielded as soon as it has been read.
+    """
+    decoder = json.JSONDecoder()
+    chunks = read_chunks(file)
+    buffer = ""
+    position = 0
+    array_started = False
+
+    while True:
+        # skip whitespace and separators, reading more input when the buffer is exhausted
+        while position < len(buffer) and buffer[position] in JSON_SEPARATORS[array_started]:
+            position += 1
+        if position == len(buffer):
+            buffer, position = next(chunks, None), 0
+            if buffer is None:
+                raise ValueError("Unexpected end of JSON document list")
+            continue
+
+        if not array_started:
+            if buffer[position] != "[":
+                raise ValueError("JSON document list must be an array")
+            array_started = True
+            position += 1
+            continue
+
+        if buffer[position] == "]":
+            return
+
+        try:
+            doc, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # the document is incomplete, read more input and retry
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
         # Documents that do not have a <TEXT> tag can be ignored
         if doc["text"] is not None:
             yield doc["docno"], doc["text"]
\ No newline at end of file
@@ -4,13 +4,22 @@ INDEX_BASE=os.path.expanduser("~/.air18/index/")
 
 SETTINGS_FILEPATH = os.path.join(INDEX_BASE, "settings.p")
 STATISTICS_FILEPATH = os.path.join(INDEX_BASE, "statistics.p")
-DOCUMENT_STATISTICS_FILEPATH = os.path.join(INDEX_BASE, "document_statistics.p")
-DOCID_DOCNO_MAPPING = os.path.join(INDEX_BASE, "docid_docno_mapping.p")
+DOCUMENT_LENGTHS_PATH = os.path.join(INDEX_BASE, "document_lengths.npy")
+DOCUMENT_AVGTFS_PATH = os.path.join(INDEX_BASE, "document_avgtfs.npy")
+DOCNOS_PATH = os.path.join(INDEX_BASE, "docnos.npy")
+DOCNO_OFFSETS_PATH = os.path.join(INDEX_BASE, "docno_offsets.npy")
+INCREMENTS_FILEPATH = os.path.join(INDEX_BASE, "increments.p")
+SHARDS_FILEPATH = os.path.join(INDEX_BASE, "shards.p")
+IMPACTS_FILEPATH = os.path.join(INDEX_BASE, "impacts.p")
 
-SIMPLE_INDEX_PATH = os.path.join(INDEX_BASE, "simple_index.p")
+SIMPLE_INDEX_PATH = os.path.join(INDEX_BASE, "simple_index.bin")
+SIMPLE_INDEX_INDEX_PATH = os.path.join(INDEX_BASE, "simple_index_dictionary.bin")
+SIMPLE_INDEX_BOUNDS_PATH = os.path.join(INDEX_BASE, "simple_index_bounds.bin")
 
-SPIMI_INDEX_PATH = os.path.join(INDEX_BASE, "spimi_index.txt")
-SPIMI_INDEX_INDEX_PATH = os.path.join(INDEX_BASE, "spimi_index_index.p")
+SPIMI_INDEX_PATH = os.path.join(INDEX_BASE, "spimi_index.bin")
+SPIMI_INDEX_INDEX_PATH = os.path.join(INDEX_BASE, "spimi_index_dictionary.bin")
+SPIMI_INDEX_BOUNDS_PATH = os.path.join(INDEX_BASE, "spimi_index_bounds.bin")
 
 RESOURCES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "resources")
 DEFAULT_TOPIC_FILE=os.path.join(RESOURCES_DIR, "topicsTREC8Adhoc.txt")
+DEFAULT_QRELS_FILE=os.path.join(RESOURCES_DIR, "qrels.trec8.adhoc.parts1-5")
@@ -0,0 +1,151 @@
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+
+class Profile:
+    """
+    Wall clock time spent in named stages, counters and per-call latencies of the current process, reported as JSON.
+    While disabled, all methods return immediately and wrapped functions and iterables are returned unchanged, so
+    instrumented code runs at full speed.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.timings = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.latencies = defaultdict(list)
+
+    def enable(self):
+        self.enabled = True
+
+    def time(self, stage):
+        """
+        :return: context manager adding the time spent in it to stage
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self.timer(stage)
+
+    @contextmanager
+    def timer(self, stage, latencies=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage] += elapsed
+            if latencies is not None:
+                latencies.append(elapsed)
+
+    def latency(self, name):
+        """
+        :return: context manager adding the time spent in it to stage name and recording it as one latency of name
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self.timer(name, self.latencies[name])
+
+    def reset(self):
+        """
+        Discard everything recorded so far, e.g. the measurements a forked worker process inherits from its parent.
+        """
+        self.timings.clear()
+        self.counters.clear()
+        self.latencies.clear()
+
+    def collect(self):
+        """
+        Take everything recorded since the last collect or reset, so that a worker process can pass it to the parent
+        along with its results.
+
+        :return: Tuple (timings, counters, latencies) of dictionaries for merge, None if profiling is disabled
+        """
+        if not self.enabled:
+            return None
+        data = dict(self.timings), dict(self.counters), dict(self.latencies)
+        self.reset()
+        return data
+
+    def merge(self, data):
+        """
+        Add the measurements collected in another process.
+
+        :param data: result of collect
+        """
+        if data is None:
+            return
+        timings, counters, latencies = data
+        for stage, seconds in timings.items():
+            self.timings[stage] += seconds
+        for counter, n in counters.items():
+            self.counters[counter] += n
+        for name, values in latencies.items():
+            self.latencies[name].extend(values)
+
+    def count(self, counter, n=1):
+        if self.enabled:
+            self.counters[counter] += n
+
+    def timed(self, stage, function):
+        """
+        :return: function, with the time spent in its calls added to stage if profiling is enabled
+        """
+        if not self.enabled:
+            return function
+
+        def timed_function(*args, **kwargs):
+            with self.timer(stage):
+                return function(*args, **kwargs)
+        return timed_function
+
+    def timed_iter(self, stage, iterable):
+        """
+        :return: iterable, with the time spent producing its items added to stage if profiling is enabled
+        """
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(stage, iter(iterable))
+
+    def _timed_iter(self, stage, iterator):
+        while True:
+            with self.timer(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self):
+        """
+        :return: dictionary of timings in seconds, counters, their rates per second over the total time and latency
+                 statistics in milliseconds
+        """
+        total = self.timings.get("total")
+        rates = {"{}_per_second".format(counter): value / total for counter, value in self.counters.items()
+                 if total}
+
+        latencies = {}
+        for name, values in self.latencies.items():
+            if not values:
+                continue
+            values = np.array(values) * 1000
+            latencies[name] = {"count": len(values), "mean_ms": float(values.mean()), "max_ms": float(values.max())}
+            for percentile in LATENCY_PERCENTILES:
+                latencies[name]["p{}_ms".format(percentile)] = float(np.percentile(values, percentile))
+
+        return {"timings": dict(self.timings), "counters": dict(self.counters), "rates": rates,
+                "latencies": latencies}
+
+    def write(self, file=sys.stderr):
+        json.dump(self.report(), file, indent=2)
+        file.write("\n")
+
+
+# profile of this process, enabled by the --profile option of the scripts
+profile = Profile()
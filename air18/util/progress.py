@@ -3,7 +3,7 @@ import sys
 
 
 class ProgressBar:
-    def __init__(self, text, max_value=26):
+    def __init__(self, text, max_value):
         self.text = text
         if sys.stdout.isatty():
             self.pbar = progressbar.ProgressBar(widgets=["{0:40} ".format(text),
@@ -18,12 +18,9 @@ class ProgressBar:
         if self.pbar is not None:
             self.pbar.update(self.pbar.value + 1)
 
-    def update(self, token):
+    def update(self, value):
         if self.pbar is not None:
-            char = token[0]
-            value = ord(char) - 97      # maps a-z to 0-25
-            if value > 0:
-                self.pbar.update(value)
+            self.pbar.update(min(value, self.pbar.max_value))
 
     def finish(self):
         if self.pbar is not None:
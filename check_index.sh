@@ -0,0 +1,32 @@
+#!/bin/bash
+
+set -e
+
+# Index the given directories with spimi sequentially and with parallel workers, both with a small memory limit so
+# that many blocks are written, and check that all index files are identical. The settings record the options and
+# are expected to differ. The index directory is overwritten.
+if [ $# -eq 0 ]; then
+    echo "usage: $0 <directories>" >&2
+    exit 2
+fi
+
+INDEX_DIR=~/.air18/index
+CHECK_DIR=$(mktemp -d)
+trap 'rm -rf "$CHECK_DIR"' EXIT
+
+python3 -m air18.index --indexing-method spimi --memory-limit 1 --case-folding --stop-words --stemming "$@" > /dev/null
+cp -r "$INDEX_DIR" "$CHECK_DIR/sequential"
+python3 -m air18.index --indexing-method spimi --memory-limit 1 --workers 3 --case-folding --stop-words --stemming \
+    "$@" > /dev/null
+
+status=0
+for file in "$CHECK_DIR"/sequential/*; do
+    name=$(basename "$file")
+    [ "$name" = settings.p ] && continue
+    if ! cmp -s "$file" "$INDEX_DIR/$name"; then
+        echo "$name differs between sequential and parallel indexing"
+        status=1
+    fi
+done
+[ $status -eq 0 ] && echo "sequential and parallel indexes are identical"
+exit $status